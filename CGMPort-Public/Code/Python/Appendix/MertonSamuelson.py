@@ -13,22 +13,21 @@ from copy import copy
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Calibration and solution
 
 # Import parameters from external file
-sys.path.append(os.path.realpath('../')) 
+sys.path.append(my_file_path)
 # Loading the parameters from the ../Code/Calibration/params.py script
 from Calibration.params import dict_portfolio, time_params, det_income, Mu, Rfree, Std, norm_factor
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
+from Tools.stationary import solve_stationary
 
 # Create new dictionary
 merton_dict = copy(dict_portfolio)
@@ -43,8 +42,14 @@ RiskyDrawFunc = cpm.LogNormalRiskyDstnDraw(RiskyAvg=mu, RiskyStd=Std) # Generate
 merton_dict['approxRiskyDstn'] = RiskyDstnFunc
 merton_dict['drawRiskyFunc'] = RiskyDrawFunc
 
-agent = cpm.PortfolioConsumerType(**merton_dict)
-agent.solve()
+agent = solve_cached(merton_dict)
+
+# Infinitely lived agent: the last period of life repeated forever, without
+# the mortality of that period
+inf_dict = copy(merton_dict)
+inf_dict['LivPrb'] = [1.0]*merton_dict['T_cycle']
+inf_sol = solve_stationary(inf_dict, accel = 'anderson')
+inf_norm = norm_factor[merton_dict['T_cycle'] - 1]
 
 # %%
 
@@ -64,6 +69,9 @@ for a in ages:
     plt.plot(eevalgrid,
              agent.solution[a-age_born].RiskyShareFunc[0][0](eevalgrid/norm_factor[a-age_born]),
              label = 'Age = %i' %(a))
+plt.plot(eevalgrid,
+         inf_sol.RiskyShareFunc[0][0](eevalgrid/inf_norm),
+         label = 'Infinite horizon')
 plt.axhline(agent.MertSamCampVicShare, c='k',ls='--', label = 'M&S Share') # The Campbell-Viceira approximation
 plt.ylim(0,1.05)
 plt.text((aMax-aMin)/4,0.15,r'$\uparrow $ limit as  $m \uparrow \infty$',fontsize = 22,fontweight='bold')
@@ -73,11 +81,6 @@ plt.xlabel('Wealth (m)')
 
 # Save figure
 figname = 'Merton_Samuelson_Limit'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
+save_figure(FigPath, figname)
+
+show_figure()
@@ -15,21 +15,19 @@ from copy import copy
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Import calibration
 # Import parameters from external file
-sys.path.append(os.path.realpath('../')) 
+sys.path.append(my_file_path)
 # Loading the parameters from the ../Code/Calibration/params.py script
 from Calibration.params import dict_portfolio, time_params
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
 
 # %% Adjust parameters for portfolio tool
 
@@ -62,8 +60,7 @@ pf_dict['PermGroFac'] = [1]*80
 pf_dict['aXtraCount'] = 100
 
 # %% Create both agents
-port_agent = cpm.PortfolioConsumerType(**pf_dict)
-port_agent.solve()
+port_agent = solve_cached(pf_dict)
 
 pf_agent = cis.PerfForesightConsumerType(**pf_dict)
 pf_agent.solve()
@@ -127,14 +124,9 @@ for ax in axs.flat:
 
 # Save figure
 figname = 'PF_Compare_Lvl'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
+save_figure(FigPath, figname)
 
-plt.ioff()
-plt.draw()
-plt.pause(1)
+show_figure()
 
 # %% Differences plots
 
@@ -165,11 +157,6 @@ fig.tight_layout(rect=[0, 0.05, 1, 0.95])
 
 # Save figure
 figname = 'PF_Compare_Diff'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
\ No newline at end of file
+save_figure(FigPath, figname)
+
+show_figure()
\ No newline at end of file
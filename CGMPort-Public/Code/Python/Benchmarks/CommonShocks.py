@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Precision of the difference between the consumption profiles implied by two
+calibrations (CRRA = 5 and the base CRRA = 10), simulated with independent
+shocks and with a common pre-drawn shock panel (Tools.shocks), and the time
+spent simulating with and without a panel.
+"""
+
+import time
+from copy import copy
+
+import numpy as np
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.egm import setup_cgm, solve_cgm
+from Tools.cohort import simulate_cohort
+from Tools.shocks import draw_shock_panel
+
+# %% Setup
+def solved_agent(params):
+    agent = setup_cgm(params)[0]
+    agent.solution = solve_cgm(params)
+    return agent
+
+low_risk_aversion = copy(dict_portfolio)
+low_risk_aversion['CRRA'] = 5.0
+agents = [solved_agent(dict_portfolio), solved_agent(low_risk_aversion)]
+
+N = 2000
+repeats = 20
+
+def mean_cons(history):
+    return (history.cNrmNow_hist*history.pLvlNow_hist).mean(axis = 1)
+
+# %% Compare
+base = []
+diffs = {'independent': [], 'common': []}
+times = {'independent': 0.0, 'common': 0.0}
+for r in range(repeats):
+
+    start = time.time()
+    profiles = [mean_cons(simulate_cohort(agent, N, seed = 2*r + i))
+                for i, agent in enumerate(agents)]
+    times['independent'] += time.time() - start
+    diffs['independent'].append(profiles[1] - profiles[0])
+    base.append(profiles[0])
+
+    panel = draw_shock_panel(agents[0].T_cycle, N, seed = r)
+    start = time.time()
+    profiles = [mean_cons(simulate_cohort(agent, N, shocks = panel))
+                for agent in agents]
+    times['common'] += time.time() - start
+    diffs['common'].append(profiles[1] - profiles[0])
+
+# Standard deviation of the difference across repetitions, relative to mean
+# consumption and averaged over ages
+base = np.mean(base, axis = 0)
+print('{:>12}{:>22}{:>24}'.format('shocks', 'sd of difference (%)',
+                                  'simulation time (ms)'))
+for name in ['independent', 'common']:
+    sd = np.mean(np.array(diffs[name]).std(axis = 0)/base)
+    print('{:>12}{:>22.2f}{:>24.1f}'.format(name, 100*sd,
+                                            1000*times[name]/repeats/2))
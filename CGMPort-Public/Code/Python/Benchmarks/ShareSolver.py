@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the two ways in which Tools.egm can find the optimal risky share:
+interpolating the first order condition over a grid of RiskyShareCount shares
+('grid', as HARK does) and solving for its root with a safeguarded Newton
+method ('root').
+
+For several sizes of the asset and share grids, the table reports the number
+of evaluations of the first order condition, the solution time and the
+accuracy of the shares. Accuracy is measured as the largest Newton step
+|FOC/FOC'| left at any interior share, which approximates the distance from
+each share to the exact root of its first order condition.
+"""
+
+import time
+from copy import copy
+
+import numpy as np
+
+import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.egm import solve_cgm, make_shock_dstns, calc_share_FOC_der
+
+# %% Accuracy measure
+def share_error(params, solution):
+    '''
+    Largest Newton step |FOC/FOC'| at the interior shares of a solution.
+    '''
+    agent = cpm.PortfolioConsumerType(**params)
+    ShockDstns = make_shock_dstns(agent)
+
+    error = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for t in range(agent.T_cycle):
+            aGrid = solution[t].aGrid[1:]
+            Share = solution[t].ShareGrid[1:]
+            inner = np.logical_and(Share > 0.0, Share < 1.0)
+            if not np.any(inner):
+                continue
+            FOC, dFOC = calc_share_FOC_der(aGrid[inner], Share[inner],
+                                           ShockDstns[t], agent.Rfree,
+                                           agent.PermGroFac[t], agent.CRRA,
+                                           solution[t+1].cFunc[0][0])
+            error = max(error, np.max(np.abs(FOC/dFOC)))
+
+    return error
+
+# %% Benchmark
+print('{:>8}{:>8}{:>12}{:>12}{:>12}'.format('aCount', 'method', 'FOC evals',
+                                            'time (s)', 'error'))
+for aXtraCount in [100, 400, 1600]:
+
+    for method, ShareCount in [('grid', 10), ('grid', 30), ('grid', 100),
+                               ('root', 30)]:
+
+        params = copy(dict_portfolio)
+        params['aXtraCount'] = aXtraCount
+        params['RiskyShareCount'] = ShareCount
+
+        start = time.time()
+        solution = solve_cgm(params, share_method = method)
+        elapsed = time.time() - start
+
+        evals = sum([sol.FOCevals for sol in solution])
+        label = method if method == 'root' else method + str(ShareCount)
+
+        print('{:>8}{:>8}{:>12}{:>12.2f}{:>12.1e}'.format(aXtraCount, label, evals,
+                                                       elapsed,
+                                                       share_error(params, solution)))
@@ -160,6 +160,11 @@ Std = 0.157 # standard deviation of rate-of-return shocks
 RiskyDstnFunc = lambda count: approxNormal(count, mu = Mu + Rfree, sigma = Std)
 RiskyDrawFunc = lambda rngSeed: drawNormal(1, mu = Mu + Rfree, sigma = Std,
                                            seed = rngSeed)
+# Parameters of the normal distribution, so that tools that draw returns for
+# many agents at once (Tools.cohort) can recognize it however this file is
+# imported
+RiskyDstnFunc.mu = Mu + Rfree
+RiskyDstnFunc.sigma = Std
 
 # Make a dictionary to specify the rest of params
 dict_portfolio = { 
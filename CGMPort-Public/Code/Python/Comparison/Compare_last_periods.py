@@ -7,27 +7,25 @@ Created on Sun Dec  1 13:43:31 2019
 
 import numpy as np
 
-import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
-
 # Plotting tools
 import matplotlib.pyplot as plt
 
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Import calibration
-sys.path.append('../')
+sys.path.append(my_file_path)
 from Calibration.params import dict_portfolio, time_params, norm_factor
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
+from Tools.tables import PolicyTable
+from Tools.fortran import load_fortran_years
 
 # %% Setup
 
@@ -35,56 +33,30 @@ from Calibration.params import dict_portfolio, time_params, norm_factor
 n_periods = time_params['Age_death'] - time_params['Age_born']
 years_comp = range(n_periods-2,n_periods)
 
-# Number of years
-nyears = len(years_comp)
-
-# Path to fortran output
-pathFort = os.path.join(my_file_path,"../Fortran/")
-
 # Asset grid
 npoints = 401
 agrid = np.linspace(4,npoints+3,npoints)
 
-# Initialize consumption, value, and share matrices
+# %% Read and split policy functions
+# Only the requested years are read from the memory mapped binary cache of
+# the Fortran outputs
 # (rows = age, cols = assets)
-cons  = np.zeros((nyears, npoints))
-val   = np.zeros((nyears, npoints))
-share = np.zeros((nyears, npoints))
+fortran = load_fortran_years(n_periods)[years_comp]
+share = fortran[:,0,:]
+cons  = fortran[:,1,:]
+val   = fortran[:,2,:]
 
-# %% Read and split policy functions
-for i in range(len(years_comp)):
-    
-    year = years_comp[i]
-    y = year + 1
-    if y < 10:
-        ystring = '0' + str(y)
-    else:
-        ystring = str(y)
-        
-    rawdata = np.loadtxt(pathFort + 'year' + ystring + '.txt')
-    
-    share[i,:] = rawdata[range(npoints)]
-    cons[i,:]  = rawdata[range(npoints,2*npoints)]
-    val[i,:]   = rawdata[range(2*npoints,3*npoints)]
-    
 # %% Compute HARK's policy functions and store them in the same format
-agent = cpm.PortfolioConsumerType(**dict_portfolio)
-agent.solve()
+agent = solve_cached(dict_portfolio)
 
 # CGM's fortran code does not output the policy functions for the final period.
 # thus len(agent.solve) = nyears + 1
 
-# Initialize HARK's counterparts to the policy function matrices
-h_cons  = np.zeros((nyears, npoints))
-h_share = np.zeros((nyears, npoints))
-
-# Fill with HARK's interpolated policy function at the required points
-for i in range(len(years_comp)):
-    
-    year = years_comp[i]
-    
-    h_cons[i,:]  = agent.solution[year].cFunc[0][0](agrid/norm_factor[year])*norm_factor[year]
-    h_share[i,:] = agent.solution[year].RiskyShareFunc[0][0](agrid/norm_factor[year])
+# Tabulate HARK's policy functions at the required points
+# (rows = age, cols = assets)
+table = PolicyTable(agent.solution, norm_factor, agrid, ages = years_comp)
+h_cons  = table.cons
+h_share = table.share
 
 # %% Compare the results
 
@@ -124,14 +96,9 @@ for i in range(len(years_comp)):
      
      # Save figure
      figname = 'PolFunc_Compare_Y' + str(year + time_params['Age_born'])
-     plt.savefig(os.path.join(FigPath, figname + '.png'))
-     plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-     plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-     plt.savefig(os.path.join(FigPath, figname + '.svg'))
+     save_figure(FigPath, figname)
      
-     plt.ioff()
-     plt.draw()
-     plt.pause(1)
+     show_figure()
      
 cons_error   = h_cons - cons
 share_error = h_share - share
\ No newline at end of file
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Warm-started solves along a path of a single parameter.
+
+When one parameter moves in small steps (say CRRA from 2 to 10, or Mu from
+0.02 to 0.08) the policy functions at neighbouring points are nearly
+identical. solve_path solves the points in order and seeds the search for the
+optimal risky share at every age with the solution of the previous point, so
+that the first order condition is only evaluated at a few shares around the
+previous optimum instead of over the whole RiskyShareCount grid (see
+Tools.egm.find_share_warm). The results are identical to independent solves.
+
+Only the share search is warm started. The grids are not: the end-of-period
+asset grid of the endogenous gridpoints method is set by the calibration
+(aXtraMin, aXtraMax, aXtraCount...) rather than searched for, and the
+consumption grid follows from it, so the window of the share search is the
+only bound that depends on the previous solution.
+"""
+
+import numpy as np
+import pandas as pd
+
+import Calibration.params as base_calib
+from Tools.egm import solve_cgm
+from Tools.sweep import income_norm_factor, make_params, SweepResult
+from Tools.tables import PolicyTable
+
+def solve_path(base, name, values, wealth = np.linspace(0,300,100), ages = None,
+               age_born = base_calib.time_params['Age_born'],
+               norm_factor = None, width = 2):
+    '''
+    Solves the model at a sequence of values of one parameter, warm starting
+    each solve from the previous one.
+
+    Parameters
+    ----------
+    base : dict
+        Base calibration, such as Calibration.params.dict_portfolio.
+    name : str
+        Parameter that changes along the path. Any axis accepted by
+        Tools.sweep.sweep.
+    values : [float]
+        Values of the parameter, in the order in which they will be solved.
+        Closer neighbours make the warm start more effective.
+    wealth, ages, age_born, norm_factor
+        Points at which the policy functions are tabulated, as in
+        Tools.sweep.sweep.
+    width : int
+        Half width (in gridpoints of the share grid) of the window searched
+        around the previous solution.
+
+    Returns
+    -------
+    result : SweepResult
+        Policies at every point of the path.
+    report : pd.DataFrame
+        For every point, the evaluations of the first order condition for the
+        share that the solve took (FOCevals), those that a solve from scratch
+        takes (FOCevalsCold) and the fraction saved.
+    '''
+    if ages is None:
+        ages = age_born + np.arange(base['T_cycle'])
+    ages = np.asarray(ages)
+    if norm_factor is None:
+        norm_factor = income_norm_factor(base)
+
+    cons = np.zeros((len(values), ages.size, len(wealth)))
+    share = np.zeros((len(values), ages.size, len(wealth)))
+    evals = np.zeros(len(values), dtype=int)
+    evals_cold = np.zeros(len(values), dtype=int)
+
+    guess = None
+    for i, value in enumerate(values):
+        params = make_params(base, {name: value})
+        solution = solve_cgm(params, guess = guess, width = width)
+
+        table = PolicyTable(solution, norm_factor, wealth, ages = ages, age_born = age_born)
+        cons[i], share[i] = table.cons, table.share
+
+        evals[i] = sum([sol.FOCevals for sol in solution])
+        evals_cold[i] = params['RiskyShareCount']*sum([sol.aGrid.size - 1
+                                                      for sol in solution[:-1]])
+        guess = solution
+
+    points = pd.DataFrame({name: values})
+    result = SweepResult(points, ages, np.asarray(wealth), cons, share)
+
+    report = points.copy()
+    report['FOCevals'] = evals
+    report['FOCevalsCold'] = evals_cold
+    report['Saved'] = 1.0 - evals/evals_cold
+
+    return result, report
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Simulation of many economies, each with its own history of aggregate returns.
+
+In the model the risky return is an aggregate shock, so the agents of one
+economy share a single history of returns. A single simulated cohort
+therefore either reflects one return history (common_returns = True in
+Tools.cohort.simulate_cohort) or mixes the return risk of many histories into
+its cross section (independent returns for every agent, the default).
+simulate_economies keeps the two sources of risk apart: it simulates K
+economies of N agents at once, with the returns drawn once per age and
+economy, and returns histories with a leading economy axis. Age profiles can
+then be computed for every economy and pooled over all of them, and the
+dispersion of the per-economy profiles measures the effect of aggregate risk.
+
+The K economies are simulated in the same vectorized pass, as a single
+cohort of K*N agents whose return draws are repeated within each economy.
+"""
+
+import numpy as np
+
+from Tools.cohort import CohortHistory, agent_risky_draws, simulate_cohort
+
+# %% Return draws
+
+class EconomyDraws(object):
+    '''
+    Draws of the risky return that are common to the agents of each of K
+    economies of equal size, laid out one economy after the other.
+    '''
+
+    def __init__(self, RiskyDraw, K):
+        self.RiskyDraw = RiskyDraw
+        self.K = K
+
+    def __call__(self, N, RNG):
+        return np.repeat(self.RiskyDraw(self.K, RNG), N//self.K)
+
+    def ppf(self, u):
+        # The first agent's uniform decides the return of every economy
+        u = np.asarray(u).reshape(self.K, -1)
+        return np.repeat(self.RiskyDraw.ppf(u[:, 0]), u.shape[1])
+
+# %% Simulation
+
+class EconomyHistory(CohortHistory):
+    '''
+    The simulated histories of K economies. Histories (and the alive mask,
+    if there is one) are stored in arrays with shape (economies x ages x
+    agents).
+    '''
+
+    def economy_mean(self, values):
+        '''
+        Mean of an (economies x ages x agents) array at every age of every
+        economy, conditional on survival.
+        '''
+        if self.alive is None:
+            return values.mean(axis=2)
+        return np.nansum(np.where(self.alive, values, 0.0), axis=2) / \
+               self.alive.sum(axis=2)
+
+    def pooled_mean(self, values):
+        '''
+        Mean at every age over the agents of all economies, conditional on
+        survival.
+        '''
+        if self.alive is None:
+            return values.mean(axis=(0, 2))
+        return np.nansum(np.where(self.alive, values, 0.0), axis=(0, 2)) / \
+               self.alive.sum(axis=(0, 2))
+
+    def economy_quantile(self, values, q):
+        '''
+        Quantile q at every age of every economy, conditional on survival.
+        '''
+        if self.alive is None:
+            return np.quantile(values, q, axis=2)
+        return np.nanquantile(np.where(self.alive, values, np.nan), q, axis=2)
+
+    def pooled_quantile(self, values, q):
+        '''
+        Quantile q at every age over the agents of all economies, conditional
+        on survival.
+        '''
+        values = np.swapaxes(values, 0, 1).reshape(values.shape[1], -1)
+        if self.alive is None:
+            return np.quantile(values, q, axis=1)
+        alive = np.swapaxes(self.alive, 0, 1).reshape(values.shape)
+        return np.nanquantile(np.where(alive, values, np.nan), q, axis=1)
+
+def simulate_economies(agent, K, N, seed=0, RiskyDraw=None, **kwargs):
+    '''
+    Simulates K economies of N agents, each economy with its own history of
+    aggregate risky returns.
+
+    Parameters
+    ----------
+    agent : PortfolioConsumerType
+        A solved agent.
+    K : int
+        Number of economies.
+    N : int
+        Number of agents in every economy.
+    seed : int or np.random.SeedSequence
+        Seed of the random number generator.
+    RiskyDraw : function
+        Function (K, RNG) -> array of K draws of the risky return factor.
+        Defaults to draws from the agent's own return distribution (see
+        Tools.cohort.agent_risky_draws).
+    **kwargs
+        Other arguments of Tools.cohort.simulate_cohort, such as survival,
+        track_vars, sampling or shocks (a panel with K*N agents).
+
+    Returns
+    -------
+    history : EconomyHistory
+        The simulated histories, with a leading economy axis.
+    '''
+    if RiskyDraw is None:
+        RiskyDraw = agent_risky_draws(agent)
+    if kwargs.get('common_returns', False):
+        raise ValueError('Returns are always common within an economy.')
+
+    flat = simulate_cohort(agent, K*N, seed=seed,
+                           RiskyDraw=EconomyDraws(RiskyDraw, K), **kwargs)
+
+    def split(x):
+        # (ages x K*N) -> (economies x ages x agents)
+        return np.swapaxes(x.reshape(x.shape[0], K, N), 0, 1)
+
+    hist = dict([(name[:-5], split(value)) for name, value in vars(flat).items()
+                 if name.endswith('_hist')])
+    alive = None if flat.alive is None else split(flat.alive)
+
+    return EconomyHistory(flat.ages, flat.weight, alive, hist,
+                          flat.units.reshape(K, N))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Saving and displaying the figures of the simulation, comparison and appendix
+scripts.
+
+Every figure used to be saved four times (png, jpg, pdf and svg), each time
+re-rendering it in the main process, and then shown with plt.pause(1), which
+adds at least a second per figure and needs an interactive backend. When the
+scripts run without a display (e.g. in continuous integration, or from
+do_ALL.py, which selects the Agg backend) that time is wasted.
+
+save_figure pickles the figure once and hands the encoding of every requested
+format to a pool of worker processes, so that the main process can continue
+with the next computation while the files are written. The formats that are
+written can be restricted with the environment variable CGM_FIG_FORMATS (e.g.
+CGM_FIG_FORMATS=png) and the number of workers set with CGM_FIG_WORKERS (0
+writes the files in the main process). show_figure only draws and pauses when
+the backend is interactive. wait_figures blocks until all pending files have
+been written; it is also called when the interpreter exits.
+"""
+
+import atexit
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+# Formats written by default and formats that were requested
+all_formats = ['png', 'jpg', 'pdf', 'svg']
+formats = [f.strip() for f in os.environ.get('CGM_FIG_FORMATS', ','.join(all_formats)).split(',')
+           if f.strip() != '']
+
+# Number of worker processes that encode the figures
+workers = int(os.environ.get('CGM_FIG_WORKERS', min(len(formats), os.cpu_count() or 1)))
+
+_pool = None
+_pending = []
+
+# %% Workers
+
+def _encode(data, fname):
+    '''
+    Unpickles a figure and writes it to fname, in the format given by the
+    file's extension.
+    '''
+    matplotlib.use('Agg')
+    fig = pickle.loads(data)
+    fig.savefig(fname)
+    plt.close(fig)
+    return fname
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+# %% Saving
+
+def save_figure(FigPath, figname, fig=None, fmts=None):
+    '''
+    Saves a figure as FigPath/figname.<format> in every requested format.
+
+    Parameters
+    ----------
+    FigPath : str
+        Folder in which the figure is saved.
+    figname : str
+        Name of the files, without extension.
+    fig : matplotlib.figure.Figure
+        Figure to save. Defaults to the current figure.
+    fmts : [str]
+        Formats to write. Defaults to the formats requested through
+        CGM_FIG_FORMATS (all of png, jpg, pdf and svg if it is not set).
+
+    Returns
+    -------
+    None
+    '''
+    if fig is None:
+        fig = plt.gcf()
+    if fmts is None:
+        fmts = formats
+    fnames = [os.path.join(FigPath, figname + '.' + fmt) for fmt in fmts]
+
+    data = None
+    if workers > 0 and len(fnames) > 0:
+        try:
+            data = pickle.dumps(fig)
+        except Exception:
+            # Figures with artists that cannot be pickled are saved here
+            data = None
+
+    if data is None:
+        for fname in fnames:
+            fig.savefig(fname)
+    else:
+        pool = _get_pool()
+        _pending.extend([pool.submit(_encode, data, fname) for fname in fnames])
+
+def wait_figures():
+    '''
+    Waits until all the figures handed to the workers have been written,
+    raising any error that occurred while writing them.
+    '''
+    global _pending
+    pending, _pending = _pending, []
+    for future in pending:
+        future.result()
+
+atexit.register(wait_figures)
+
+# %% Display
+
+def show_figure():
+    '''
+    Displays the current figure if the backend is interactive. With a
+    non-interactive backend (such as Agg) it does nothing.
+    '''
+    backend = matplotlib.get_backend().lower()
+    if backend in ['agg', 'pdf', 'ps', 'svg', 'cairo', 'template'] or \
+       'inline' in backend:
+        return
+    plt.ioff()
+    plt.draw()
+    plt.pause(1)
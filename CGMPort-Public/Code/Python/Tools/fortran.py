@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Fast access to the policy functions computed by CGM's Fortran code.
+
+The Fortran program writes one text file per age, Code/Fortran/year01.txt to
+year80.txt, each with three blocks of 401 values: the risky share, the
+consumption and the value function over a grid of cash on hand. Rather than
+parsing the 80 files in every comparison script, load_fortran_years converts
+them once into a single (ages x 3 x 401) .npy array in Code/Python/Cache and
+memory maps it on later calls, which reads only the ages that are actually
+used. The conversion is redone whenever the modification times or sizes of
+the text files change.
+
+The same outputs are also shipped combined in an Excel workbook,
+Code/Fortran/Combined Fortran data.xlsx (sheet r.Data, one row per age and
+gridpoint). load_fortran_workbook ingests it into the same layout, checking
+it against the text files, so that either source can be used. The workbook
+is read with the standard library's zip and XML parsers.
+"""
+
+import json
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from Tools.cache import CachePath
+
+# Folder with the Fortran outputs (Code/Fortran)
+FortranPath = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                           os.path.abspath(__file__)))), 'Fortran')
+
+# Workbook with the combined outputs
+WorkbookFile = os.path.join(FortranPath, 'Combined Fortran data.xlsx')
+
+# Size of the cash on hand grid and order of the blocks in every file
+npoints = 401
+blocks = ['share', 'cons', 'val']
+
+# Columns of the workbook's data sheet with each block
+workbook_columns = ['RiskyShare', 'Consumption', 'Value']
+
+# Bump this whenever the layout of the stored array changes
+fortran_cache_version = 1
+
+# %% Text files
+
+def year_file(year, path=FortranPath):
+    '''
+    Path of the Fortran output for a year (1 to 80) of the agent's life.
+    '''
+    return os.path.join(path, 'year%02i.txt' % year)
+
+def read_year(fname):
+    '''
+    Reads a Fortran output file into a (3 x npoints) array with the share,
+    consumption and value blocks.
+    '''
+    with open(fname) as f:
+        values = np.array(f.read().split(), dtype=float)
+    return values.reshape(len(blocks), npoints)
+
+def file_stamp(fnames):
+    '''
+    Identifies the current version of some files by their modification times
+    and sizes.
+    '''
+    stamp = {'version': fortran_cache_version, 'files': {}}
+    for fname in fnames:
+        info = os.stat(fname)
+        stamp['files'][os.path.basename(fname)] = [info.st_mtime_ns, info.st_size]
+    return stamp
+
+# %% Workbook
+
+_ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_rel_ns = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+def _column(ref):
+    '''
+    Column letters of a cell reference such as 'AB12'.
+    '''
+    return ref.rstrip('0123456789')
+
+def read_workbook(fname=WorkbookFile, sheet='r.Data'):
+    '''
+    Reads the data sheet of the workbook with the combined Fortran outputs.
+
+    Parameters
+    ----------
+    fname : str
+        Path of the workbook.
+    sheet : str
+        Name of the sheet with one row per age and gridpoint and the columns
+        Age, Cash (the index of the gridpoint), RiskyShare, Consumption and
+        Value.
+
+    Returns
+    -------
+    ages : np.array
+        Ages in the sheet, in increasing order.
+    data : np.array
+        Array with shape (ages x 3 x npoints) with the share, consumption and
+        value blocks, as in load_fortran_years.
+    '''
+    with zipfile.ZipFile(fname) as book:
+
+        # Find the file of the sheet through the workbook's relationships
+        workbook = ET.fromstring(book.read('xl/workbook.xml'))
+        rid = [s.get(_rel_ns + 'id') for s in workbook.iter(_ns + 'sheet')
+               if s.get('name') == sheet]
+        if len(rid) == 0:
+            raise ValueError('The workbook has no sheet ' + sheet)
+        rels = ET.fromstring(book.read('xl/_rels/workbook.xml.rels'))
+        target = [r.get('Target') for r in rels if r.get('Id') == rid[0]][0]
+
+        strings = []
+        if 'xl/sharedStrings.xml' in book.namelist():
+            strings = [''.join(t.text or '' for t in si.iter(_ns + 't'))
+                       for si in ET.fromstring(book.read('xl/sharedStrings.xml'))]
+
+        # Stream the rows, which only hold the header and numbers
+        header = None
+        rows = []
+        with book.open('xl/' + target.lstrip('/').replace('xl/', '', 1)) as f:
+            for event, elem in ET.iterparse(f):
+                if elem.tag != _ns + 'row':
+                    continue
+                cells = dict([(_column(c.get('r')), c) for c in elem.iter(_ns + 'c')])
+                if header is None:
+                    header = dict([(strings[int(c.find(_ns + 'v').text)]
+                                    if c.get('t') == 's' else c.find(_ns + 'v').text, col)
+                                   for col, c in cells.items()])
+                    columns = [header[name] for name in ['Age', 'Cash'] + workbook_columns]
+                else:
+                    rows.append([float(cells[col].find(_ns + 'v').text)
+                                 for col in columns])
+                elem.clear()
+
+    rows = np.array(rows)
+    ages, age_index = np.unique(rows[:, 0].astype(int), return_inverse=True)
+    data = np.full((ages.size, len(blocks), npoints), np.nan)
+    data[age_index, :, rows[:, 1].astype(int)] = rows[:, 2:]
+
+    return ages, data
+
+# %% Binary cache
+
+def load_fortran_years(nyears=80, path=FortranPath, cache_path=CachePath,
+                       mmap_mode='r'):
+    '''
+    Returns the Fortran policy functions of every age as an array with shape
+    (nyears x 3 x npoints), memory mapped from a binary cache that is
+    (re)built from the text files when needed. The blocks along the second
+    axis are, in order, the risky share, consumption and value function.
+
+    Parameters
+    ----------
+    nyears : int
+        Number of year files.
+    path : str
+        Folder with the Fortran outputs.
+    cache_path : str
+        Folder in which the binary array is stored.
+    mmap_mode : str
+        Memory map mode passed to np.load. None reads the whole array.
+
+    Returns
+    -------
+    years : np.array
+        The policy functions, with years[t] the age index t (year t+1).
+    '''
+    stamp = file_stamp([year_file(y, path) for y in range(1, nyears + 1)])
+
+    def build():
+        return np.array([read_year(year_file(y, path)) for y in range(1, nyears + 1)]), {}
+
+    return _cached_array('FortranYears', stamp, build, cache_path, mmap_mode)
+
+def load_fortran_workbook(nyears=80, fname=WorkbookFile, path=FortranPath,
+                          cache_path=CachePath, mmap_mode='r', tol=1e-6):
+    '''
+    Returns the Fortran policy functions stored in the combined workbook, in
+    the same layout as load_fortran_years, memory mapped from a binary cache
+    that is (re)built when the workbook or the text files change. When it is
+    built, the workbook is checked against the text files.
+
+    Parameters
+    ----------
+    nyears : int
+        Number of ages (and year files).
+    fname : str
+        Path of the workbook.
+    path : str
+        Folder with the Fortran text outputs.
+    cache_path : str
+        Folder in which the binary array is stored.
+    mmap_mode : str
+        Memory map mode passed to np.load. None reads the whole array.
+    tol : float
+        Largest difference with the text files (relative to the size of the
+        values, or absolute for values smaller than one) that is accepted.
+
+    Returns
+    -------
+    data : np.array
+        The policy functions, with data[t] the age index t (year t+1).
+    '''
+    stamp = file_stamp([fname] + [year_file(y, path) for y in range(1, nyears + 1)])
+
+    def build():
+        ages, data = read_workbook(fname)
+        if ages.size != nyears or np.any(np.isnan(data)):
+            raise ValueError('The workbook does not have %i complete ages.' % nyears)
+
+        years = load_fortran_years(nyears, path, cache_path, mmap_mode=None)
+        diff = np.abs(data - years)/np.maximum(np.abs(years), 1.0)
+        check = dict([(block, float(diff[:, i].max())) for i, block in enumerate(blocks)])
+        if max(check.values()) > tol:
+            raise ValueError('The workbook differs from the year files: ' + str(check))
+
+        return data, {'ages': ages.tolist(), 'check': check}
+
+    return _cached_array('FortranWorkbook', stamp, build, cache_path, mmap_mode)
+
+def _cached_array(name, stamp, build, cache_path, mmap_mode):
+    '''
+    Returns the array stored as <name>.npy in cache_path if the stamp stored
+    next to it matches the given one, and otherwise builds it and stores it
+    along with the stamp and any information returned by build.
+    '''
+    fname = os.path.join(cache_path, name + '.npy')
+    stamp_name = os.path.join(cache_path, name + '.json')
+
+    stored = None
+    if os.path.exists(fname) and os.path.exists(stamp_name):
+        with open(stamp_name) as f:
+            stored = json.load(f)
+
+    if stored is None or stored.get('stamp') != stamp:
+        data, info = build()
+
+        # Write under temporary names and move in place, as Tools.cache does
+        os.makedirs(cache_path, exist_ok=True)
+        tmp_name = fname + '.%i.tmp' % os.getpid()
+        with open(tmp_name, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_name, fname)
+
+        info['stamp'] = stamp
+        tmp_name = stamp_name + '.%i.tmp' % os.getpid()
+        with open(tmp_name, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp_name, stamp_name)
+
+    return np.load(fname, mmap_mode=mmap_mode)
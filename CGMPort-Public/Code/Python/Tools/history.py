@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Compact storage of simulated histories.
+
+HARK stores every variable in track_vars as a float64 array with one row per
+simulated period and one column per agent, which for a million agents over
+80 ages means 640MB per variable, the age included. A HistoryRecorder stores
+each variable with its own dtype (by default float32, and int8 for the age),
+only at the ages that are requested, and optionally in .npy files on disk
+that are memory mapped, so the operating system can page histories out
+instead of running out of memory. The files can be reopened later with
+load_history without simulating again.
+
+Recorders are fed by Tools.cohort.simulate_cohort through its recorder
+argument.
+"""
+
+import json
+import os
+
+import numpy as np
+
+# Storage types used when a variable's dtype is not given
+default_dtypes = {'t_age': np.int8, 'alive': np.bool_}
+default_float = np.float32
+
+# %% Recorder
+
+class HistoryRecorder(object):
+    '''
+    Records the histories of some variables of a simulated cohort.
+
+    Parameters
+    ----------
+    ages : np.array
+        Ages (in years) that will be simulated, such as the ages attribute of
+        a Tools.cohort.CohortHistory.
+    N : int
+        Number of agents.
+    variables : [str] or dict
+        Variables to record: mNrmNow, cNrmNow, aNrmNow, pLvlNow,
+        RiskyShareNow, mLvlNow, cLvlNow, t_age (the age in years) or alive
+        (which agents are alive, when survival is simulated with a mask). A
+        dictionary can map each name to the dtype used to store it.
+    record_ages : [int]
+        Ages at which the variables are recorded. Defaults to all of them.
+    every : int
+        Records only every k-th of the (selected) ages, starting with the
+        first one.
+    path : str
+        Folder in which to store the histories as memory mapped .npy files,
+        one per variable. If None, histories are kept in memory.
+    '''
+
+    def __init__(self, ages, N, variables, record_ages=None, every=1, path=None):
+        ages = np.asarray(ages, dtype=int)
+        if record_ages is not None:
+            ages = ages[np.isin(ages, record_ages)]
+        self.ages = ages[::every]
+        self.N = N
+        self.path = path
+
+        if not isinstance(variables, dict):
+            variables = dict([(var, default_dtypes.get(var, default_float))
+                              for var in variables])
+        self.dtypes = dict([(var, np.dtype(dtype)) for var, dtype in variables.items()])
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, 'history.json'), 'w') as f:
+                json.dump({'ages': self.ages.tolist(), 'N': N,
+                           'dtypes': dict([(var, dtype.str) for var, dtype
+                                           in self.dtypes.items()])}, f)
+
+        self.hist = {}
+        for var, dtype in self.dtypes.items():
+            shape = (self.ages.size, N)
+            if path is None:
+                self.hist[var] = np.zeros(shape, dtype=dtype)
+            else:
+                self.hist[var] = np.lib.format.open_memmap(
+                    os.path.join(path, var + '.npy'), mode='w+', dtype=dtype,
+                    shape=shape)
+
+    def __getattr__(self, name):
+        # Histories are available as <variable>_hist, as in HARK
+        if name.endswith('_hist') and name[:-5] in self.__dict__.get('hist', {}):
+            return self.hist[name[:-5]]
+        raise AttributeError(name)
+
+    def nbytes(self):
+        '''
+        Total size of the recorded histories, in bytes.
+        '''
+        return sum([x.nbytes for x in self.hist.values()])
+
+    def record(self, age, values):
+        '''
+        Stores the values of the variables at one age, if it is recorded.
+
+        Parameters
+        ----------
+        age : int
+            Age (in years) of the cohort.
+        values : dict
+            Arrays with the values of the variables for every agent. The age
+            is filled in automatically.
+        '''
+        row = np.searchsorted(self.ages, age)
+        if row >= self.ages.size or self.ages[row] != age:
+            return
+        for var, hist in self.hist.items():
+            hist[row] = age if var == 't_age' else values[var]
+
+    def age_mean(self, var):
+        '''
+        Mean of a recorded variable at every recorded age, conditional on
+        survival if the alive mask was recorded. Rows are processed one at a
+        time and in double precision, so memory mapped histories are never
+        loaded whole.
+        '''
+        means = np.zeros(self.ages.size)
+        for row in range(self.ages.size):
+            x = np.asarray(self.hist[var][row], dtype=float)
+            if 'alive' in self.hist:
+                x = x[self.hist['alive'][row]]
+            means[row] = x.mean()
+        return means
+
+    def flush(self):
+        '''
+        Writes memory mapped histories to disk.
+        '''
+        for hist in self.hist.values():
+            if isinstance(hist, np.memmap):
+                hist.flush()
+
+def load_history(path, mmap_mode='r'):
+    '''
+    Reopens the histories stored by a HistoryRecorder with a path.
+
+    Parameters
+    ----------
+    path : str
+        Folder with the stored histories.
+    mmap_mode : str
+        Memory map mode passed to np.load. None reads the histories into
+        memory.
+
+    Returns
+    -------
+    recorder : HistoryRecorder
+        Recorder whose histories are the stored arrays.
+    '''
+    with open(os.path.join(path, 'history.json')) as f:
+        meta = json.load(f)
+
+    recorder = HistoryRecorder.__new__(HistoryRecorder)
+    recorder.ages = np.array(meta['ages'], dtype=int)
+    recorder.N = meta['N']
+    recorder.path = path
+    recorder.dtypes = dict([(var, np.dtype(dtype)) for var, dtype in meta['dtypes'].items()])
+    recorder.hist = dict([(var, np.load(os.path.join(path, var + '.npy'),
+                                        mmap_mode=mmap_mode))
+                          for var in recorder.dtypes])
+
+    return recorder
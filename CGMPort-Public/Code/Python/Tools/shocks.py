@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-drawn panels of shocks for cohort simulations.
+
+A ShockPanel holds, for every agent and age, the uniform draws behind its
+initial conditions, income shocks, risky returns and (optionally) deaths.
+Tools.cohort.simulate_cohort turns them into shocks by inversion: income
+shocks and initial conditions with the distributions of the agent being
+simulated, and returns with the ppf of its RiskyDraw, which defaults to the
+agent's own return distribution (Tools.cohort.agent_risky_draws). Because
+the panel stores uniforms rather than shocks, the same panel can be reused
+with calibrations that have different income risk, returns or preferences,
+so that comparisons between them (e.g. CRRA = 5 vs. 10) use common random
+numbers and their differences are not blurred by sampling noise. Simulating from a panel also
+avoids drawing random numbers period by period.
+
+Panels can be drawn with any of the samplings in Tools.variance, saved with
+ShockPanel.save (as a folder with one .npy file per array) and reloaded,
+optionally memory mapped, with load_shock_panel.
+"""
+
+import os
+
+import numpy as np
+
+from Tools.variance import UniformDraws
+
+# %% Panels
+
+class ShockPanel(object):
+    '''
+    Uniform draws behind the shocks of a simulated cohort.
+
+    Attributes
+    ----------
+    initial : np.array
+        (2 x agents) array with the draws of initial assets and permanent
+        income.
+    income : np.array
+        (ages x agents) array with the draws of income shocks.
+    risky : np.array
+        (ages x agents) array with the draws of idiosyncratic risky returns.
+    risky_common : np.array
+        Draw of the return common to all agents at every age, used with
+        common_returns = True.
+    survive : np.array
+        (ages - 1 x agents) array with the draws that decide deaths with
+        survival = 'mask', or None.
+    units : np.array
+        Independent unit of every agent (see Tools.variance.UniformDraws).
+    '''
+
+    def __init__(self, initial, income, risky, risky_common, survive=None,
+                 units=None):
+        self.initial = initial
+        self.income = income
+        self.risky = risky
+        self.risky_common = risky_common
+        self.survive = survive
+        if units is None:
+            units = np.arange(income.shape[1])
+        self.units = units
+
+    @property
+    def T(self):
+        return self.income.shape[0]
+
+    @property
+    def N(self):
+        return self.income.shape[1]
+
+    def save(self, path):
+        '''
+        Saves the panel in a folder, with one .npy file per array.
+        '''
+        os.makedirs(path, exist_ok=True)
+        for name in ['initial', 'income', 'risky', 'risky_common', 'units',
+                     'survive']:
+            fname = os.path.join(path, name + '.npy')
+            if getattr(self, name) is not None:
+                np.save(fname, getattr(self, name))
+            elif os.path.exists(fname):
+                os.remove(fname)
+
+def draw_shock_panel(T, N, seed=0, sampling='mc', replicates=16, mask=False):
+    '''
+    Draws the shocks of a cohort simulation in bulk.
+
+    Parameters
+    ----------
+    T : int
+        Number of ages, usually the agents' T_cycle.
+    N : int
+        Number of agents.
+    seed : int or np.random.SeedSequence
+        Seed of the random number generator.
+    sampling : str
+        'mc', 'antithetic' or 'sobol' (see Tools.variance).
+    replicates : int
+        Number of independent replicates with Sobol sampling.
+    mask : bool
+        Whether to also draw the uniforms that decide deaths with
+        survival = 'mask'.
+
+    Returns
+    -------
+    panel : ShockPanel
+        The drawn panel.
+    '''
+    RNG = np.random.default_rng(seed)
+    Uniforms = UniformDraws(sampling, N, RNG, replicates)
+
+    initial = Uniforms(2)
+    income = np.zeros((T, N))
+    risky = np.zeros((T, N))
+    for t in range(T):
+        income[t], risky[t] = Uniforms(2)
+    risky_common = RNG.random(T)
+
+    survive = RNG.random((T-1, N)) if mask else None
+
+    return ShockPanel(initial, income, risky, risky_common, survive,
+                      Uniforms.units)
+
+def load_shock_panel(path, mmap_mode=None):
+    '''
+    Loads a panel stored with ShockPanel.save. With mmap_mode = 'r' the
+    arrays are memory mapped instead of read into memory.
+    '''
+    arrays = {}
+    for name in ['initial', 'income', 'risky', 'risky_common', 'units',
+                 'survive']:
+        fname = os.path.join(path, name + '.npy')
+        arrays[name] = np.load(fname, mmap_mode=mmap_mode) if os.path.exists(fname) else None
+    return ShockPanel(**arrays)
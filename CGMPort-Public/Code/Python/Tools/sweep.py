@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel sweeps over the parameters of the CGM calibration.
+
+The robustness checks and the sensitivity analyses in the paper (risk
+aversion, income risk, equity premium...) require solving the model for many
+variations of Calibration/params.py. The function sweep takes a base
+calibration dictionary and a set of parameter axes, solves every combination
+of them in a pool of processes using Tools.egm, and collects the policy
+functions (tabulated over ages and wealth levels) and their summaries over
+the wealth grid.
+
+Axes can be any key of the calibration dictionary (e.g. 'CRRA', 'DiscFac',
+'Rfree'), the scalar shock sizes 'PermShkStd' and 'TranShkStd', which are
+applied to every working age, or the parameters of the risky return
+distribution 'Mu' (equity premium) and 'Std' (standard deviation of returns).
+Sweeping Rfree, Mu or Std rebuilds the normal return distribution, keeping
+whatever is not swept (including the equity premium when Rfree changes) at
+its value in the base calibration.
+"""
+
+import itertools
+import multiprocessing
+from copy import copy
+
+import numpy as np
+import pandas as pd
+
+from HARK.utilities import approxNormal
+
+import Calibration.params as base_calib
+from Tools.egm import solve_cgm
+from Tools.tables import PolicyTable
+
+# %% Picklable calibrations
+
+class NormalRiskyDstn(object):
+    '''
+    Discretized normal distribution of the risky return factor, with mean
+    Rfree + Mu and standard deviation Std. Equivalent to RiskyDstnFunc in
+    Calibration/params.py, but it can be sent to other processes.
+    '''
+
+    def __init__(self, Mu, Std, Rfree):
+        self.Mu = Mu
+        self.Std = Std
+        self.Rfree = Rfree
+
+    def __call__(self, count):
+        return approxNormal(count, mu = self.Mu + self.Rfree, sigma = self.Std)
+
+class FixedRiskyDstn(object):
+    '''
+    Stand-in for a risky return distribution function that always returns the
+    same (already discretized) distribution.
+    '''
+
+    def __init__(self, RiskyDstn):
+        self.RiskyDstn = RiskyDstn
+
+    def __call__(self, count):
+        return self.RiskyDstn
+
+def return_params(params):
+    '''
+    Equity premium Mu and standard deviation Std of the risky return in a
+    calibration: those of its NormalRiskyDstn, or the mean (net of Rfree) and
+    standard deviation of its discretized approxRiskyDstn otherwise.
+    '''
+    RiskyDstn = params['approxRiskyDstn']
+    if isinstance(RiskyDstn, NormalRiskyDstn):
+        return RiskyDstn.Mu, RiskyDstn.Std
+
+    prob, values = RiskyDstn(params['RiskyCount'])
+    mean = np.dot(prob, values)
+    return mean - params['Rfree'], np.sqrt(np.dot(prob, (values - mean)**2))
+
+def income_norm_factor(params):
+    '''
+    Deterministic permanent income at every age of a calibration (det_income
+    in Calibration/params.py), built from its initial permanent income and
+    growth factors. It is the normalization factor of its policies.
+    '''
+    return np.exp(params['pLvlInitMean']) * \
+           np.concatenate(([1.0], np.cumprod(params['PermGroFac'])))
+
+def make_params(base, point, Mu=None, Std=None):
+    '''
+    Applies one point of a sweep to a base calibration, returning a new
+    dictionary that does not contain lambdas, so that it can be pickled.
+
+    Parameters
+    ----------
+    base : dict
+        Base calibration, such as Calibration.params.dict_portfolio.
+    point : dict
+        Values of the swept parameters at this point.
+    Mu, Std : float
+        Equity premium and standard deviation of returns used when they are
+        not swept but the return distribution is rebuilt. Default to those of
+        base (see return_params).
+
+    Returns
+    -------
+    params : dict
+        The calibration at the requested point.
+    '''
+    params = copy(base)
+    params.pop('drawRiskyFunc', None) # Only needed for simulations
+
+    for name, value in point.items():
+        if name in ['Mu', 'Std']:
+            continue
+        elif name in ['PermShkStd', 'TranShkStd']:
+            params[name] = value*np.ones(len(base[name]))
+        elif name in base:
+            params[name] = value
+        else:
+            raise ValueError('Unknown parameter to sweep: ' + name)
+
+    if 'Rfree' in point or 'Mu' in point or 'Std' in point:
+        if Mu is None or Std is None:
+            base_Mu, base_Std = return_params(base)
+            Mu = base_Mu if Mu is None else Mu
+            Std = base_Std if Std is None else Std
+        params['approxRiskyDstn'] = NormalRiskyDstn(Mu = point.get('Mu', Mu),
+                                                    Std = point.get('Std', Std),
+                                                    Rfree = params['Rfree'])
+    else:
+        params['approxRiskyDstn'] = FixedRiskyDstn(base['approxRiskyDstn'](base['RiskyCount']))
+
+    return params
+
+# %% Solving
+
+def _solve_point(task):
+    '''
+    Solves the model at one point of the sweep and tabulates its policies.
+    Runs in a worker process.
+    '''
+    index, params, wealth, ages, age_born, norm_factor, share_method = task
+
+    solution = solve_cgm(params, share_method = share_method)
+    table = PolicyTable(solution, norm_factor, wealth, ages = ages, age_born = age_born)
+
+    return index, table.cons, table.share
+
+class SweepResult(object):
+    '''
+    Results of a parameter sweep.
+
+    Attributes
+    ----------
+    points : pd.DataFrame
+        One row per point of the sweep, with the values of the swept parameters.
+    ages : np.array
+        Ages (in years) at which policies were tabulated.
+    wealth : np.array
+        Wealth levels at which policies were tabulated.
+    cons : np.array
+        Consumption, with shape (points, ages, wealth levels).
+    share : np.array
+        Risky share, with shape (points, ages, wealth levels).
+    '''
+
+    def __init__(self, points, ages, wealth, cons, share):
+        self.points = points
+        self.ages = ages
+        self.wealth = wealth
+        self.cons = cons
+        self.share = share
+
+    def policies(self):
+        '''
+        Returns the tabulated policies as a tidy data frame with one row per
+        (point, age, wealth level).
+        '''
+        n_points, n_ages, n_wealth = self.cons.shape
+        frame = self.points.iloc[np.repeat(np.arange(n_points), n_ages*n_wealth)]
+        frame = frame.reset_index(drop = True)
+        frame['Age'] = np.tile(np.repeat(self.ages, n_wealth), n_points)
+        frame['Wealth'] = np.tile(self.wealth, n_points*n_ages)
+        frame['Cons'] = self.cons.flatten()
+        frame['Share'] = self.share.flatten()
+        return frame
+
+    def grid_moments(self):
+        '''
+        Returns summaries of the policies over the wealth grid as a tidy data
+        frame with one row per (point, age): the average, minimum and maximum
+        risky share, the average consumption and the average marginal
+        propensity to consume out of wealth. Averages weight every gridpoint
+        equally; they are not means over the distribution of agents.
+        '''
+        n_points, n_ages, n_wealth = self.cons.shape
+        frame = self.points.iloc[np.repeat(np.arange(n_points), n_ages)]
+        frame = frame.reset_index(drop = True)
+        frame['Age'] = np.tile(self.ages, n_points)
+
+        MPC = np.diff(self.cons, axis = 2)/np.diff(self.wealth)
+        frame['GridAvgShare'] = self.share.mean(axis = 2).flatten()
+        frame['GridMinShare'] = self.share.min(axis = 2).flatten()
+        frame['GridMaxShare'] = self.share.max(axis = 2).flatten()
+        frame['GridAvgCons'] = self.cons.mean(axis = 2).flatten()
+        frame['GridAvgMPC'] = MPC.mean(axis = 2).flatten()
+        return frame
+
+def sweep(base, axes, wealth = np.linspace(0,300,100), ages = None,
+          age_born = base_calib.time_params['Age_born'],
+          norm_factor = None, processes = None,
+          share_method = 'grid'):
+    '''
+    Solves the model at every combination of the given parameter values.
+
+    Parameters
+    ----------
+    base : dict
+        Base calibration, such as Calibration.params.dict_portfolio.
+    axes : dict
+        Maps the name of each swept parameter to the list of values it takes.
+        The sweep covers their cartesian product.
+    wealth : np.array
+        Wealth levels at which to tabulate the policy functions.
+    ages : [int]
+        Ages (in years) at which to tabulate the policy functions. All ages by
+        default.
+    age_born : int
+        Age at which agents enter the model.
+    norm_factor : np.array
+        Normalization factor applied to wealth and consumption at every age.
+        Defaults to the deterministic income profile of base (see
+        income_norm_factor).
+    processes : int
+        Number of worker processes. Defaults to the number of cores. With
+        processes = 1 everything runs in the current process.
+    share_method : str
+        How to find the optimal risky share, 'grid' or 'root'. See
+        Tools.egm.solve_one_period.
+
+    Returns
+    -------
+    result : SweepResult
+        Policies at every point of the sweep.
+    '''
+    names = list(axes.keys())
+    values = list(itertools.product(*[axes[name] for name in names]))
+    points = pd.DataFrame(values, columns = names)
+
+    if ages is None:
+        ages = age_born + np.arange(base['T_cycle'])
+    ages = np.asarray(ages)
+    if norm_factor is None:
+        norm_factor = income_norm_factor(base)
+
+    tasks = [(i, make_params(base, dict(zip(names, v))), wealth, ages,
+              age_born, norm_factor, share_method)
+             for i, v in enumerate(values)]
+
+    cons = np.zeros((len(tasks), ages.size, len(wealth)))
+    share = np.zeros((len(tasks), ages.size, len(wealth)))
+
+    if processes == 1:
+        results = map(_solve_point, tasks)
+        for i, c, s in results:
+            cons[i], share[i] = c, s
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for i, c, s in pool.imap_unordered(_solve_point, tasks):
+                cons[i], share[i] = c, s
+
+    return SweepResult(points, ages, np.asarray(wealth), cons, share)
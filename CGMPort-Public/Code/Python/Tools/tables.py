@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Dense tables of the policy functions of a solved agent.
+
+The solution objects hold one consumption and one risky share function per
+age, defined over normalized resources. Plots and comparisons, however, work
+with levels of wealth and need the policies at many ages at once. A
+PolicyTable evaluates every requested age once, applying the normalization
+factor, and stores the results as (age x wealth) arrays that can be sliced
+or interpolated in a single vectorized call.
+"""
+
+import numpy as np
+
+class PolicyTable(object):
+    '''
+    Consumption and risky share policies of a solved agent evaluated on a grid
+    of ages and levels of wealth.
+
+    Parameters
+    ----------
+    solution : list
+        The solution of a PortfolioConsumerType (agent.solution) or of
+        Tools.egm.solve_cgm, ordered by age.
+    norm_factor : np.array
+        Normalization factor for every age, as in Calibration.params. Wealth
+        levels are divided by it before evaluating the policies and consumption
+        is multiplied by it afterwards.
+    wealth : np.array
+        Grid of (non-normalized) wealth levels.
+    ages : [int]
+        Ages (in years) to tabulate. Defaults to every age in norm_factor.
+    age_born : int
+        Age (in years) corresponding to the first element of the solution.
+    '''
+
+    def __init__(self, solution, norm_factor, wealth, ages=None, age_born=0):
+        norm_factor = np.asarray(norm_factor)
+        if ages is None:
+            ages = age_born + np.arange(norm_factor.size)
+
+        self.ages = np.asarray(ages, dtype=int)
+        self.wealth = np.asarray(wealth, dtype=float)
+        self.age_born = age_born
+
+        self.cons = np.zeros((self.ages.size, self.wealth.size))
+        self.share = np.zeros((self.ages.size, self.wealth.size))
+
+        for i, age in enumerate(self.ages):
+            t = age - age_born
+            mNrm = self.wealth/norm_factor[t]
+            self.cons[i, :] = solution[t].cFunc[0][0](mNrm)*norm_factor[t]
+            self.share[i, :] = solution[t].RiskyShareFunc[0][0](mNrm)
+
+    @classmethod
+    def from_arrays(cls, ages, wealth, cons, share, age_born=0):
+        '''
+        Builds a table from stored (age x wealth) arrays of consumption and
+        risky shares, such as the cons and share attributes of another table.
+        '''
+        table = cls.__new__(cls)
+        table.ages = np.asarray(ages, dtype=int)
+        table.wealth = np.asarray(wealth, dtype=float)
+        table.age_born = age_born
+        table.cons = np.asarray(cons, dtype=float)
+        table.share = np.asarray(share, dtype=float)
+        return table
+
+    def age_index(self, age):
+        '''
+        Returns the row of the table that corresponds to each requested age.
+        '''
+        age = np.asarray(age, dtype=int)
+        rows = np.searchsorted(self.ages, age)
+        rows = np.minimum(rows, self.ages.size - 1)
+        if np.any(self.ages[rows] != age):
+            raise ValueError('Some of the requested ages are not in the table.')
+        return rows
+
+    def _lookup(self, values, age, wealth):
+        '''
+        Linearly interpolates a table over wealth at the requested ages. Age
+        and wealth can be arrays of any (broadcastable) shape. Wealth beyond the
+        ends of the grid is extrapolated linearly.
+        '''
+        rows = self.age_index(age)
+        wealth = np.asarray(wealth, dtype=float)
+        rows, wealth = np.broadcast_arrays(rows, wealth)
+
+        j = np.clip(np.searchsorted(self.wealth, wealth), 1, self.wealth.size - 1)
+        alpha = (wealth - self.wealth[j-1])/(self.wealth[j] - self.wealth[j-1])
+
+        return (1.0 - alpha)*values[rows, j-1] + alpha*values[rows, j]
+
+    def cFunc(self, age, wealth):
+        '''
+        Consumption (in levels) at the given ages and levels of wealth.
+        '''
+        return self._lookup(self.cons, age, wealth)
+
+    def RiskyShareFunc(self, age, wealth):
+        '''
+        Risky share at the given ages and levels of wealth.
+        '''
+        return self._lookup(self.share, age, wealth)
@@ -1,47 +1,90 @@
 # %% Set up plot displays
+# Figures are rendered off screen and written by Tools.figures; set the
+# environment variable MPLBACKEND to display them, and CGM_FIG_FORMATS
+# (e.g. 'png,pdf') to write only some formats.
+import os
+import sys
 import matplotlib
-from IPython import get_ipython
-get_ipython().run_line_magic('matplotlib', 'auto')
+if 'MPLBACKEND' not in os.environ:
+    matplotlib.use('Agg')
 
-# %% Calibration assessment and life cycle simulations
+# Make Code/Python importable, wherever this script is run from
+my_file_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(my_file_path)
+from Tools.pipeline import Stage, run_stages
 
-# 1. Solve the model and display its policy functions
-print('1. Solve the model and display its policy functions')
-import Simulations.PolicyFuncs
+# Every stage declares the inputs it uses ('calibration', 'solution',
+# 'simulation' and 'fortran') and the figures and results it writes. Stages
+# run in parallel processes, and those whose inputs and code have not changed
+# since their last run are skipped (see Tools/pipeline.py). Set force = True
+# to run all of them.
+force = False
 
-# 2. Simulate the lives of a few agents to show the implied income
-# and stockholding processes.
-print('2. Simulate the lives of a few agents to show the implied income and stockholding processes.')
-import Simulations.FewAgents
+stages = [
 
-# 3. Run a larger simulation to display the age conditional means of variables
-# of interest.
-print('3. Run a larger simulation to display the age conditional means of variables of interest.')
-import Simulations.AgeMeans
+    # %% Calibration assessment and life cycle simulations
 
-# %% Comparison
+    # 1. Solve the model and display its policy functions
+    Stage('PolicyFuncs', 'Simulations/PolicyFuncs.py',
+          '1. Solve the model and display its policy functions',
+          inputs = ['calibration', 'solution'],
+          figures = ['RShare_Pol', 'Cons_Pol']),
 
-# 4. Solve and compare policy functions with those obtained from CGM's
-# Fortran 90 code
-print('4. Solve and compare policy functions with those obtained from CGM\'s Fortran 90 code')
-import Comparison.ComparePolFuncs
+    # 2. Simulate the lives of a few agents to show the implied income
+    # and stockholding processes.
+    Stage('FewAgents', 'Simulations/FewAgents.py',
+          '2. Simulate the lives of a few agents to show the implied income and stockholding processes.',
+          inputs = ['calibration', 'solution', 'simulation'],
+          figures = ['Y_Sim', 'RShare_Sim']),
 
-# 5. Present more detailed figures on discrepancies for the last periods of
-# life.
-print('5. Present more detailed figures on discrepancies for the last periods of life.')
-import Comparison.Compare_last_periods
+    # 3. Run a larger simulation to display the age conditional means of variables
+    # of interest.
+    Stage('AgeMeans', 'Simulations/AgeMeans.py',
+          '3. Run a larger simulation to display the age conditional means of variables of interest.',
+          inputs = ['calibration', 'solution', 'simulation'],
+          figures = ['YMC_Means', 'RShare_Means']),
 
-# %% Appendix
+    # %% Comparison
 
-print('6. Compare HARK\'s risky share policy functions at their limits with Merton\'s theoretical result.')
-import Appendix.MertonSamuelson
+    # 4. Solve and compare policy functions with those obtained from CGM's
+    # Fortran 90 code
+    Stage('ComparePolFuncs', 'Comparison/ComparePolFuncs.py',
+          '4. Solve and compare policy functions with those obtained from CGM\'s Fortran 90 code',
+          inputs = ['calibration', 'solution', 'fortran'],
+          figures = ['Cons_Pol_Compare', 'RShare_Pol_Compare'],
+          results = ['Cache/PolFunc_Discrepancy.json', 'Cache/PolFunc_Discrepancy.csv']),
 
-# 7. Use HARK to compare the limiting MPC to the theoretical result obtained
-# when there is no income risk and no riskless asset.
-print('7. Use HARK to compare the limiting MPC to the theoretical result obtained when there is no income risk and no riskless asset.')
-import Appendix.MPCLimit
+    # 5. Present more detailed figures on discrepancies for the last periods of
+    # life.
+    Stage('Compare_last_periods', 'Comparison/Compare_last_periods.py',
+          '5. Present more detailed figures on discrepancies for the last periods of life.',
+          inputs = ['calibration', 'solution', 'fortran'],
+          figures = ['PolFunc_Compare_Y98', 'PolFunc_Compare_Y99']),
 
-# 8. Turn off all shocks and check if consumption converges to its analytical
-# perfect foresight solution
-print('8. Turn off all shocks and check if consumption converges to its analytical perfect foresight solution')
-import Appendix.PF_analytical_sol
\ No newline at end of file
+    # %% Appendix
+
+    # 6. Compare HARK's risky share policy functions at their limits with
+    # Merton's theoretical result.
+    Stage('MertonSamuelson', 'Appendix/MertonSamuelson.py',
+          '6. Compare HARK\'s risky share policy functions at their limits with Merton\'s theoretical result.',
+          inputs = ['calibration'],
+          figures = ['Merton_Samuelson_Limit']),
+
+    # 7. Use HARK to compare the limiting MPC to the theoretical result obtained
+    # when there is no income risk and no riskless asset.
+    Stage('MPCLimit', 'Appendix/MPCLimit.py',
+          '7. Use HARK to compare the limiting MPC to the theoretical result obtained when there is no income risk and no riskless asset.',
+          inputs = ['calibration'],
+          figures = ['MPC_Limit']),
+
+    # 8. Turn off all shocks and check if consumption converges to its analytical
+    # perfect foresight solution
+    Stage('PF_analytical_sol', 'Appendix/PF_analytical_sol.py',
+          '8. Turn off all shocks and check if consumption converges to its analytical perfect foresight solution',
+          inputs = ['calibration'],
+          figures = ['PF_Compare_Lvl', 'PF_Compare_Diff']),
+]
+
+# %% Run the stages
+if __name__ == '__main__':
+    run_stages(stages, force = force)
@@ -2,7 +2,6 @@
 # result in 
 # http://www.econ2.jhu.edu/people/ccarroll/public/LectureNotes/Consumption/CRRA-RateRisk.pdf
 
-import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -14,21 +13,20 @@ from copy import copy
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Import calibration
 # Import parameters from external file
-sys.path.append(os.path.realpath('../')) 
+sys.path.append(my_file_path)
 # Loading the parameters from the ../Code/Calibration/params.py script
 from Calibration.params import dict_portfolio, time_params
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
+from Tools.stationary import solve_stationary
 
 # %% Setup
 
@@ -56,9 +54,12 @@ RiskyDrawFunc = lambda seed: drawLognormal(1, mu = mu, sigma = std, seed = seed)
 mpc_dict['approxRiskyDstn'] = RiskyDstnFunc
 mpc_dict['drawRiskyFunc'] = RiskyDrawFunc
 
-agent = cpm.PortfolioConsumerType(**mpc_dict)
-agent.cylces = 0
-agent.solve()
+# Life cycle solution
+agent = solve_cached(mpc_dict)
+
+# Infinitely lived agent: the last period of life (without income risk or
+# mortality) repeated forever
+inf_sol = solve_stationary(mpc_dict, accel = 'anderson')
 
 # %% Compute the theoretical MPC (for when there is no labor income)
 
@@ -100,7 +101,10 @@ for a in ages:
     plt.plot(eevalgrid,
              MPC_approx,
              label = 'Age = %i' %(a))
-    
+
+plt.plot(eevalgrid,
+         inf_sol.cFunc[0][0](eevalgrid + 1) - inf_sol.cFunc[0][0](eevalgrid),
+         label = 'Infinite horizon')
 plt.axhline(MPC_lim, c = 'k',ls='--', label = 'Merton Samuelson' )
 plt.legend()
 plt.title('MPC approximation: $c(m+1) - c(m)$')
@@ -108,11 +112,6 @@ plt.xlabel('Market Resources $m$')
 
 # Save figure
 figname = 'MPC_Limit'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
\ No newline at end of file
+save_figure(FigPath, figname)
+
+show_figure()
\ No newline at end of file
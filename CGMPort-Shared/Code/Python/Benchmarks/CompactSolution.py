@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Size, loading time and accuracy of the solution of the base calibration
+stored as HARK's solution objects, as Tools.egm.CGMSolutions and as compact
+arrays (Tools.compact) in double and single precision.
+"""
+
+import pickle
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.cache import solve_cached
+from Tools.egm import from_hark
+from Tools.compact import compact_solution, load_compact_solution
+
+# %% Setup
+agent = solve_cached(dict_portfolio)
+repeats = 20
+mGrid = np.linspace(0.01, 400, 5000)
+folder = tempfile.mkdtemp()
+
+def max_rel_error(solution):
+    # Largest relative difference in consumption with HARK's solution
+    return max([np.nanmax(np.abs(solution[t].cFunc[0][0](mGrid) /
+                                 agent.solution[t].cFunc[0][0](mGrid) - 1.0))
+                for t in range(agent.T_cycle)])
+
+def loader(name, solution):
+    # Function that loads a stored copy of the solution
+    if name.startswith('compact'):
+        path = os.path.join(folder, name)
+        solution.save(path)
+        return lambda: load_compact_solution(path)
+    data = pickle.dumps(solution)
+    return lambda: pickle.loads(data)
+
+solutions = [('HARK', agent.solution),
+             ('CGMSolution', from_hark(agent.solution)),
+             ('compact f64', compact_solution(agent.solution)),
+             ('compact f32', compact_solution(agent.solution, np.float32))]
+
+# %% Compare
+print('{:>14}{:>12}{:>14}{:>16}'.format('storage', 'size (KB)', 'load (ms)',
+                                        'max rel. error'))
+for name, solution in solutions:
+    if name.startswith('compact'):
+        size = solution.nbytes
+    else:
+        size = len(pickle.dumps(solution))
+    load = loader(name, solution)
+    time = timeit.timeit(load, number = repeats)/repeats
+
+    print('{:>14}{:>12.1f}{:>14.2f}{:>16.2e}'.format(name, size/1024, time*1000,
+                                                     max_rel_error(load())))
+
+shutil.rmtree(folder)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the parallel cohort simulation (Tools.parallel) with different
+numbers of processes, and a check that results do not depend on the number
+of processes for a fixed seed and number of chunks.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.cache import solve_cached
+from Tools.parallel import CohortInputs, simulate_parallel
+
+# %% Setup
+N = 200000
+chunks = 8
+variables = ['pLvlNow', 'RiskyShareNow', 'mLvlNow', 'cLvlNow']
+
+if __name__ == '__main__':
+
+    inputs = CohortInputs(solve_cached(dict_portfolio))
+    cores = multiprocessing.cpu_count()
+    counts = sorted(set([1, 2, 4, cores]))
+
+    # %% Compare
+    print('{} cores, {} agents in {} chunks'.format(cores, N, chunks))
+    print('{:>10}{:>12}{:>16}{:>14}'.format('processes', 'time (s)',
+                                            'agents/second', 'identical'))
+    reference = None
+    for processes in counts:
+
+        start = time.time()
+        history, stats = simulate_parallel(inputs, N, seed = 0, chunks = chunks,
+                                           processes = processes,
+                                           variables = variables)
+        elapsed = time.time() - start
+
+        result = np.array([stats.mean(var) for var in variables] +
+                          [stats.quantile(var, 0.5) for var in variables])
+        if reference is None:
+            reference = result
+
+        print('{:>10}{:>12.2f}{:>16.0f}{:>14}'.format(processes, elapsed,
+                                                      N/elapsed,
+                                                      str(np.array_equal(result, reference))))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Cost for every worker of getting the solution, for solutions with
+increasingly fine grids: receiving a pickled copy (what a pool does with its
+initializer's arguments when workers are spawned) or attaching to the copy
+published once in shared memory (Tools.shared). The table shows the bytes
+sent to every worker, which a copy also takes in its memory, and the time it
+spends getting the solution and using it once.
+"""
+
+import pickle
+import timeit
+
+import numpy as np
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.cache import solve_cached
+from Tools.egm import CGMSolution, from_hark
+from Tools.shared import attach_solution, publish_solution
+
+# %% Setup
+repeats = 5
+refinements = [1, 10, 100]
+
+def refine(solution, factor):
+    # Same policies on grids with factor times as many points
+    fine = []
+    for sol in solution:
+        i = np.linspace(0, sol.mGrid.size - 1, factor*sol.mGrid.size)
+        mGrid = np.interp(i, np.arange(sol.mGrid.size), sol.mGrid)
+        aGrid = np.interp(i, np.arange(sol.aGrid.size), sol.aGrid)
+        fine.append(CGMSolution(mGrid, sol.cFunc[0][0](mGrid), aGrid,
+                                sol.RiskyShareFunc[0][0](aGrid),
+                                sol.RiskyShareFunc[0][0].limit))
+    return fine
+
+def receive(data):
+    # A worker that unpickles its own copy and uses it
+    solution = pickle.loads(data)
+    return solution[0].cFunc[0][0](1.0)
+
+def attach(data):
+    # A worker that attaches to the published copy and uses it
+    solution = attach_solution(pickle.loads(data))
+    return solution[0].cFunc[0][0](1.0)
+
+agent = solve_cached(dict_portfolio)
+base = from_hark(agent.solution[:agent.T_cycle])
+
+# %% Compare
+print('{:>10}{:>26}{:>26}'.format('', 'copy', 'shared'))
+print('{:>10}{:>12}{:>14}{:>12}{:>14}'.format('points', 'sent (KB)', 'startup (ms)',
+                                              'sent (KB)', 'startup (ms)'))
+for factor in refinements:
+    solution = refine(base, factor)
+
+    data = pickle.dumps(solution)
+    copied = timeit.timeit(lambda: receive(data), number = repeats)/repeats
+
+    with publish_solution(solution) as shared:
+        handle = pickle.dumps(shared.handle)
+        attached = timeit.timeit(lambda: attach(handle), number = repeats)/repeats
+
+    print('{:>10}{:>12.1f}{:>14.2f}{:>12.1f}{:>14.2f}'.format(
+          solution[0].mGrid.size, len(data)/1024, copied*1000,
+          len(handle)/1024, attached*1000))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Memory and time saved by building each distinct joint shock distribution
+only once (Tools.egm.make_shock_dstns with dedupe = True) instead of once per
+period.
+"""
+
+import timeit
+
+import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.egm import make_shock_dstns, dstn_memory
+
+# %% Setup
+agent = cpm.PortfolioConsumerType(**dict_portfolio)
+repeats = 20
+
+# %% Compare
+print('{:>10}{:>10}{:>14}{:>14}'.format('dedupe', 'unique', 'memory (KB)',
+                                          'setup (ms)'))
+for dedupe in [False, True]:
+
+    ShockDstns = make_shock_dstns(agent, dedupe = dedupe)
+    unique = len(set([id(x) for x in ShockDstns]))
+    used, unshared = dstn_memory(ShockDstns)
+
+    time = timeit.timeit(lambda: make_shock_dstns(agent, dedupe = dedupe),
+                         number = repeats)/repeats
+
+    print('{:>10}{:>10}{:>14.1f}{:>14.2f}'.format(str(dedupe), unique,
+                                                  used/1024, time*1000))
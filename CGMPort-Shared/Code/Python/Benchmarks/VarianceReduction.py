@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Precision of simulated age profiles with plain Monte Carlo, antithetic and
+scrambled Sobol sampling (Tools.variance), with and without permanent income
+as a control variate. Standard errors are averaged over ages relative to the
+mean, and converted into the number of plain Monte Carlo agents that would
+give the same precision.
+"""
+
+import time
+
+import numpy as np
+
+# %% Import calibration
+import sys,os
+sys.path.append(os.path.realpath('../'))
+from Calibration.params import dict_portfolio
+from Tools.cache import solve_cached
+from Tools.cohort import simulate_cohort
+from Tools.variance import age_estimates, expected_pLvl
+
+# %% Setup
+agent = solve_cached(dict_portfolio)
+pLvlMean = expected_pLvl(agent)
+N = 4096
+
+def relative_se(history, control):
+    '''
+    Average standard errors of mean market resources and consumption (in
+    levels), relative to the means.
+    '''
+    result = []
+    for nrm in [history.mNrmNow_hist, history.cNrmNow_hist]:
+        values = nrm*history.pLvlNow_hist
+        if control:
+            mean, se = age_estimates(history, values, history.pLvlNow_hist, pLvlMean)
+        else:
+            mean, se = age_estimates(history, values)
+        result.append(np.mean(se/mean))
+    return result
+
+# %% Compare
+print('{:>12}{:>9}{:>10}{:>12}{:>12}{:>12}{:>12}'.format(
+      'sampling', 'control', 'time (s)', 'se M (%)', 'se C (%)',
+      'MC agents M', 'MC agents C'))
+reference = None
+for sampling in ['mc', 'antithetic', 'sobol']:
+
+    start = time.time()
+    history = simulate_cohort(agent, N, seed = 0, sampling = sampling)
+    elapsed = time.time() - start
+
+    for control in [False, True]:
+        se = relative_se(history, control)
+        if reference is None:
+            reference = se
+        agents = [N*(r/s)**2 for r, s in zip(reference, se)]
+        print('{:>12}{:>9}{:>10.2f}{:>12.3f}{:>12.3f}{:>12.0f}{:>12.0f}'.format(
+              sampling, str(control), elapsed, 100*se[0], 100*se[1],
+              agents[0], agents[1]))
@@ -31,11 +31,17 @@
 # Packages
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 
 # Import relevenat HARK tools
 import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
 
+# Tools shared with the scripts in this folder
+from Tools.tables import PolicyTable
+from Tools.cohort import simulate_cohort
+from Tools.cache import CachePath
+from Tools.panel import write_panel, read_panel, read_meta
+from Tools.artifact import artifact_key, load_artifact, save_artifact
+
 # This is a jupytext paired notebook that autogenerates BufferStockTheory.py
 # which can be executed from a terminal command line via "ipython BufferStockTheory.py"
 # But a terminal does not permit inline figures, so we need to test jupyter vs terminal
@@ -200,9 +206,22 @@ from params import dict_portfolio, time_params, det_income
 # All of the model's parameters are contained in the structure <tt>dict_portfolio<tt>, which can now be passed to HARK's <tt>PortfolioConsumerType<tt> to build and solve a representation of our problem.  
 
 # %%
-# Solve the model with the given parameters
-agent = cpm.PortfolioConsumerType(**dict_portfolio)
-agent.solve()
+# The policies and simulations shown below are bundled with the notebook
+# (Results/CGM_REMARK_v3.npz), keyed by a hash of the calibration, of the
+# settings in spec and of the code that computes them. If they match they are
+# loaded, so that the figures appear right away; otherwise the model is solved
+# and simulated in this notebook.
+spec = {'wealth': np.linspace(0,300,100), # Grid for the policy functions
+        'AgentCount': 5, 'T_sim': 80,     # Simulation of a few agents
+        'N': 10000, 'seed': 0}            # Simulation of a cohort
+results = load_artifact('CGM_REMARK', dict_portfolio, spec)
+precomputed = results is not None
+
+if not precomputed:
+    results = {}
+    # Solve the model with the given parameters
+    agent = cpm.PortfolioConsumerType(**dict_portfolio)
+    agent.solve()
 
 # %% [markdown]
 # ### A note on normalization
@@ -253,17 +272,25 @@ norm_factor = det_income*np.exp(0)
 
 # %%
 # Plot portfolio rule
-eevalgrid = np.linspace(0,300,100)
+eevalgrid = spec['wealth']
 plt.figure()
 # In the last period of life you consume everything
 # so portfolio choice is irrelevant
 
+# Tabulate the policy functions at every age on the wealth grid
+age_born = time_params['Age_born']
+if precomputed:
+    table = PolicyTable.from_arrays(results['ages'], eevalgrid, results['cons'],
+                                    results['share'], age_born = age_born)
+else:
+    table = PolicyTable(agent.solution, norm_factor, eevalgrid, age_born = age_born)
+    results.update(ages = table.ages, cons = table.cons, share = table.share)
+
 # Ages
 ages = [20,30,55,75]
-age_born = time_params['Age_born']
 for a in ages:
     plt.plot(eevalgrid,
-             agent.solution[a-age_born].RiskyShareFunc[0][0](eevalgrid/norm_factor[a-age_born]),
+             table.RiskyShareFunc(a, eevalgrid),
              label = 'Age = %i' %(a))
 plt.xlabel('Wealth')
 plt.ylabel('Risky portfolio share')
@@ -296,7 +323,7 @@ plt.figure()
 ages = [20,35,65,85]
 for a in ages:
     plt.plot(eevalgrid,
-             agent.solution[a-age_born].cFunc[0][0](eevalgrid/norm_factor[a-age_born])*norm_factor[a-age_born],
+             table.cFunc(a, eevalgrid),
              label = 'Age = %i' %(a))
 plt.xlabel('Wealth')
 plt.ylabel('Consumption')
@@ -326,23 +353,26 @@ else:
 # %% A Simulation
 # Set up simulation parameters
 
-# Number of agents and periods in the simulation.
-agent.AgentCount = 5 # Number of instances of the class to be simulated.
-# Since agents can die, they are replaced by a new agent whenever they do.
+if not precomputed:
+    # Number of agents and periods in the simulation.
+    agent.AgentCount = spec['AgentCount'] # Number of instances of the class to be simulated.
+    # Since agents can die, they are replaced by a new agent whenever they do.
 
-# Number of periods to be simulated
-agent.T_sim = 80
+    # Number of periods to be simulated
+    agent.T_sim = spec['T_sim']
 
-# Set up the variables we want to keep track of.
-agent.track_vars = ['aNrmNow','cNrmNow', 'pLvlNow', 't_age', 'RiskyShareNow','mNrmNow']
+    # Set up the variables we want to keep track of.
+    agent.track_vars = ['aNrmNow','cNrmNow', 'pLvlNow', 't_age', 'RiskyShareNow','mNrmNow']
 
-# Run the simulations
-agent.initializeSim()
-agent.simulate()
+    # Run the simulations
+    agent.initializeSim()
+    agent.simulate()
+    results.update(t_age_hist = agent.t_age_hist, pLvlNow_hist = agent.pLvlNow_hist,
+                   RiskyShareNow_hist = agent.RiskyShareNow_hist)
 
 # Present diagnostic plots.
 plt.figure()
-plt.plot(agent.t_age_hist+time_params['Age_born'], agent.pLvlNow_hist,'.')
+plt.plot(results['t_age_hist']+time_params['Age_born'], results['pLvlNow_hist'],'.')
 plt.xlabel('Age')
 plt.ylabel('Permanent income')
 plt.title('Simulated Income Paths')
@@ -355,7 +385,7 @@ else:
     plt.show(block=True)
 
 plt.figure()
-plt.plot(agent.t_age_hist+time_params['Age_born'], agent.RiskyShareNow_hist,'.')
+plt.plot(results['t_age_hist']+time_params['Age_born'], results['RiskyShareNow_hist'],'.')
 plt.xlabel('Age')
 plt.ylabel('Risky share')
 plt.title('Simulated Risky Portfolio Shares')
@@ -376,37 +406,49 @@ else:
 
 
 # %% Collect results in a DataFrame
-# Number of agents and periods in the simulation.
-agent.AgentCount = 50 # Number of instances of the class to be simulated.
-# Since agents can die, they are replaced by a new agent whenever they do.
-
-# Number of periods to be simulated
-agent.T_sim = 80*50
-
-# Run the simulations
-agent.initializeSim()
-agent.simulate()
-
-raw_data = {'Age': agent.t_age_hist.flatten()+time_params['Age_born'],
-            'pIncome': agent.pLvlNow_hist.flatten(),
-            'rShare': agent.RiskyShareNow_hist.flatten(),
-            'nrmM': agent.mNrmNow_hist.flatten(),
-            'nrmC': agent.cNrmNow_hist.flatten()}
-
-Data = pd.DataFrame(raw_data)
-Data['Cons'] = Data.nrmC * Data.pIncome
-Data['M'] = Data.nrmM * Data.pIncome
-
-# Find the mean of each variable at every age
-AgeMeans = Data.groupby(['Age']).mean().reset_index()
+# Simulate a cohort of agents through every age of their lives. Mortality
+# does not depend on the agents' states, so means conditional on survival
+# are simple averages over the cohort at each age.
+if not precomputed:
+    # The simulated panel is stored on disk, partitioned by age, so that the
+    # statistics below can be recomputed without simulating again. A panel
+    # stored by an earlier run with the same settings is reused.
+    PanelPath = os.path.join(CachePath, 'Panels', 'CGM_REMARK')
+    panel_meta = {'N': spec['N'], 'seed': spec['seed'],
+                  'key': artifact_key(dict_portfolio, spec)}
+    stored = read_meta(PanelPath)
+    if stored is None or stored['meta'] != panel_meta:
+        cohort = simulate_cohort(agent, N = spec['N'], seed = spec['seed'])
+        write_panel(cohort, PanelPath, meta = panel_meta)
+
+    Data = read_panel(PanelPath, columns = ['Age', 'pLvlNow', 'RiskyShareNow',
+                                            'mNrmNow', 'cNrmNow'])
+    Data.columns = ['Age', 'pIncome', 'rShare', 'nrmM', 'nrmC']
+    Data['Cons'] = Data.nrmC * Data.pIncome
+    Data['M'] = Data.nrmM * Data.pIncome
+
+    # Find the mean of each variable at every age, and the 5th and 95th
+    # percentiles of the risky share
+    AgeMeans = Data.groupby(['Age']).mean().reset_index()
+    rShares = Data.groupby(['Age']).rShare
+    results.update(Age = AgeMeans.Age.values,
+                   pIncome_mean = AgeMeans.pIncome.values,
+                   M_mean = AgeMeans.M.values,
+                   Cons_mean = AgeMeans.Cons.values,
+                   rShare_mean = AgeMeans.rShare.values,
+                   rShare_p5 = rShares.quantile(0.05).values,
+                   rShare_p95 = rShares.quantile(0.95).values)
+
+    # Store the results, so that the next time they can be loaded
+    save_artifact('CGM_REMARK', dict_portfolio, spec, results)
 
 # %% Simulation Plots
 plt.figure()
-plt.plot(AgeMeans.Age, AgeMeans.pIncome,
+plt.plot(results['Age'], results['pIncome_mean'],
          label = 'Income')
-plt.plot(AgeMeans.Age, AgeMeans.M,
+plt.plot(results['Age'], results['M_mean'],
          label = 'Market resources')
-plt.plot(AgeMeans.Age, AgeMeans.Cons,
+plt.plot(results['Age'], results['Cons_mean'],
          label = 'Consumption')
 plt.legend()
 plt.xlabel('Age')
@@ -423,14 +465,11 @@ else:
 # <center><img src="Figures\ConsWInc.jpg" style="height:300px"></center>
 
 # %%
-# Find age percentiles
-AgePC5 = Data.groupby(['Age']).quantile(0.05).reset_index()
-AgePC95 = Data.groupby(['Age']).quantile(0.95).reset_index()
-
+# Plot the mean and percentiles of the risky share at every age
 plt.figure()
-plt.plot(AgeMeans.Age, AgeMeans.rShare, label = 'Mean')
-plt.plot(AgePC5.Age, AgePC5.rShare, '--k')
-plt.plot(AgePC95.Age, AgePC95.rShare, '--k', label = 'Perc. 5 and 95')
+plt.plot(results['Age'], results['rShare_mean'], label = 'Mean')
+plt.plot(results['Age'], results['rShare_p5'], '--k')
+plt.plot(results['Age'], results['rShare_p95'], '--k', label = 'Perc. 5 and 95')
 plt.legend()
 
 plt.xlabel('Age')
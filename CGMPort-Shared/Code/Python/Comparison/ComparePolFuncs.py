@@ -7,8 +7,6 @@ Created on Sun Dec  1 13:43:31 2019
 
 import numpy as np
 
-import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
-
 # Plotting tools
 import matplotlib.pyplot as plt
 import seaborn
@@ -16,25 +14,24 @@ import seaborn
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
+ResPath = os.path.join(my_file_path,"Results/")
 
 # %% import Calibration
-sys.path.append('../')
-from Calibration.params import dict_portfolio, norm_factor
+sys.path.append(my_file_path)
+from Calibration.params import dict_portfolio, time_params, norm_factor
+from Tools.cache import CachePath, solve_cached
+from Tools.figures import save_figure, show_figure
+from Tools.tables import PolicyTable
+from Tools.fortran import load_fortran_years
+from Tools.discrepancy import discrepancy_report, write_report, compare_reports
 
 # %% Setup
 
-# Path to fortran output
-pathFort = os.path.join(my_file_path,"../Fortran/")
-
 # Asset grid
 npoints = 401
 agrid = np.linspace(4,npoints+3,npoints)
@@ -42,48 +39,60 @@ agrid = np.linspace(4,npoints+3,npoints)
 # number of years
 nyears = dict_portfolio['T_cycle']
 
-# Initialize consumption, value, and share matrices
+# %% Read and split policy functions
+# The Fortran outputs (year01.txt to year80.txt) are parsed once and stored
+# in a binary cache, which is memory mapped on later runs
 # (rows = age, cols = assets)
-cons  = np.zeros((nyears, npoints))
-val   = np.zeros((nyears, npoints))
-share = np.zeros((nyears, npoints))
+fortran = load_fortran_years(nyears)
+share = fortran[:,0,:]
+cons  = fortran[:,1,:]
+val   = fortran[:,2,:]
 
-# %% Read and split policy functions
-for year in range(nyears):
-    
-    y = year + 1
-    if y < 10:
-        ystring = '0' + str(y)
-    else:
-        ystring = str(y)
-        
-    rawdata = np.loadtxt(pathFort + 'year' + ystring + '.txt')
-    
-    share[year,:] = rawdata[range(npoints)]
-    cons[year,:]  = rawdata[range(npoints,2*npoints)]
-    val[year,:]   = rawdata[range(2*npoints,3*npoints)]
-    
 # %% Compute HARK's policy functions and store them in the same format
-agent = cpm.PortfolioConsumerType(**dict_portfolio)
-agent.solve()
+agent = solve_cached(dict_portfolio)
 
 # CGM's fortran code does not output the policy functions for the final period.
 # thus len(agent.solve) = nyears + 1
 
-# Initialize HARK's counterparts to the policy function matrices
-h_cons  = np.zeros((nyears, npoints))
-h_share = np.zeros((nyears, npoints))
-
-# Fill with HARK's interpolated policy function at the required points
-for year in range(nyears):
-    
-    h_cons[year,:]  = agent.solution[year].cFunc[0][0](agrid/norm_factor[year])*norm_factor[year]
-    h_share[year,:] = agent.solution[year].RiskyShareFunc[0][0](agrid/norm_factor[year])
+# Tabulate HARK's policy functions at the required points
+# (rows = age, cols = assets)
+table = PolicyTable(agent.solution, norm_factor, agrid, ages = range(nyears))
+h_cons  = table.cons
+h_share = table.share
 
 # %% Compare the results
 cons_error   = h_cons - cons
 share_error = h_share - share
 
+## Error metrics
+
+# Max. absolute, root mean squared and max. relative errors over the whole
+# grid, by age and by wealth band, stored as JSON and CSV in the cache. They
+# are checked against the committed baseline in Results, which is only
+# written if it does not exist (to update it, copy the new report over it),
+# and the script fails at the end if any of them got larger.
+ages = time_params['Age_born'] + np.arange(nyears)
+report = discrepancy_report({'Cons': (h_cons, cons), 'Share': (h_share, share)},
+                            ages, agrid)
+
+os.makedirs(CachePath, exist_ok = True)
+write_report(report, os.path.join(CachePath, 'PolFunc_Discrepancy'))
+
+baseline = os.path.join(ResPath, 'PolFunc_Discrepancy')
+regressions = []
+if os.path.exists(baseline + '.json'):
+    regressions = compare_reports(report, baseline + '.json')
+    for worse in regressions:
+        print('Larger discrepancy than in the baseline report: ' + worse)
+else:
+    os.makedirs(ResPath, exist_ok = True)
+    write_report(report, baseline)
+
+for name in report:
+    print(name + ': ' + ', '.join(['%s = %.4g' % item for item in
+                                   report[name]['Overall'].items()]) +
+          '. Worst at age %(Age)i, wealth %(Wealth)g.' % report[name]['Worst'])
+
 ## Heatmaps
 
 # Consumption
@@ -115,14 +124,9 @@ f.subplots_adjust(top=0.85)
 
 # Save figure
 figname = 'Cons_Pol_Compare'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
+save_figure(FigPath, figname)
 
-plt.ioff()
-plt.draw()
-plt.pause(1)
+show_figure()
 
 # Risky share
 f, axes = plt.subplots(1, 3, figsize=(10, 4), sharex=True)
@@ -150,11 +154,11 @@ f.subplots_adjust(top=0.85)
 
 # Save figure
 figname = 'RShare_Pol_Compare'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
\ No newline at end of file
+save_figure(FigPath, figname)
+
+show_figure()
+
+# %% Fail if the discrepancies got larger than in the baseline
+if regressions:
+    raise RuntimeError('The policy functions are further from CGM\'s than in ' +
+                       baseline + '.json: ' + '; '.join(regressions))
\ No newline at end of file
@@ -5,70 +5,47 @@ Created on Tue Dec 10 15:10:36 2019
 @author: mateo
 """
 
-import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Calibration and solution
-sys.path.append(os.path.realpath('../')) 
+sys.path.append(my_file_path)
 # Loading the parameters from the ../Code/Calibration/params.py script
-from Calibration.params import dict_portfolio, time_params
+from Calibration.params import dict_portfolio
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
+from Tools.cohort import cohort_ages, simulate_cohort
+from Tools.moments import AgeMoments
 
-agent = cpm.PortfolioConsumerType(**dict_portfolio)
-agent.solve()
+agent = solve_cached(dict_portfolio)
 
-# %% Run simulation and store results in a data frame
+# %% Run simulation and collect statistics by age
 
-# Number of agents and periods in the simulation.
-agent.AgentCount = 50 # Number of instances of the class to be simulated.
-# Since agents can die, they are replaced by a new agent whenever they do.
-
-# Number of periods to be simulated
-agent.T_sim = agent.T_cycle*50
-
-# Set up the variables we want to keep track of.
-agent.track_vars = ['aNrmNow','cNrmNow', 'pLvlNow',
-                    't_age', 'RiskyShareNow','mNrmNow']
-
-
-# Run the simulations
-agent.initializeSim()
-agent.simulate()
-
-raw_data = {'Age': agent.t_age_hist.flatten()+time_params['Age_born'],
-            'pIncome': agent.pLvlNow_hist.flatten(),
-            'rShare': agent.RiskyShareNow_hist.flatten(),
-            'nrmM': agent.mNrmNow_hist.flatten(),
-            'nrmC': agent.cNrmNow_hist.flatten()}
-
-Data = pd.DataFrame(raw_data)
-Data['Cons'] = Data.nrmC * Data.pIncome
-Data['M'] = Data.nrmM * Data.pIncome
-
-# Find the mean of each variable at every age
-AgeMeans = Data.groupby(['Age']).mean().reset_index()
+# Simulate a cohort of agents through every age of their lives. Mortality
+# does not depend on the agents' states, so means conditional on survival
+# are simple averages over the cohort at each age. Statistics are collected
+# as the simulation goes, without storing the agents' histories.
+ages = cohort_ages(agent.T_cycle)
+Stats = AgeMoments(ages, ['pLvlNow', 'RiskyShareNow', 'mLvlNow', 'cLvlNow'])
+simulate_cohort(agent, N = 10000, seed = 0, track_vars = [], aggregator = Stats)
 
 # %% Wealth income and consumption
 
 plt.figure()
-plt.plot(AgeMeans.Age, AgeMeans.pIncome,
+plt.plot(ages, Stats.mean('pLvlNow'),
          label = 'Income')
-plt.plot(AgeMeans.Age, AgeMeans.M,
+plt.plot(ages, Stats.mean('mLvlNow'),
          label = 'Market resources')
-plt.plot(AgeMeans.Age, AgeMeans.Cons,
+plt.plot(ages, Stats.mean('cLvlNow'),
          label = 'Consumption')
 plt.legend()
 plt.xlabel('Age')
@@ -77,25 +54,16 @@ plt.grid()
 
 # Save figure
 figname = 'YMC_Means'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
+save_figure(FigPath, figname)
 
-plt.ioff()
-plt.draw()
-plt.pause(1)
+show_figure()
 
 # %% Risky Share
 
-# Find age percentiles
-AgePC5 = Data.groupby(['Age']).quantile(0.05).reset_index()
-AgePC95 = Data.groupby(['Age']).quantile(0.95).reset_index()
-
 plt.figure()
-plt.plot(AgeMeans.Age, AgeMeans.rShare, label = 'Mean')
-plt.plot(AgePC5.Age, AgePC5.rShare, '--k')
-plt.plot(AgePC95.Age, AgePC95.rShare, '--k', label = 'Perc. 5 and 95')
+plt.plot(ages, Stats.mean('RiskyShareNow'), label = 'Mean')
+plt.plot(ages, Stats.quantile('RiskyShareNow', 0.05), '--k')
+plt.plot(ages, Stats.quantile('RiskyShareNow', 0.95), '--k', label = 'Perc. 5 and 95')
 plt.legend()
 
 plt.xlabel('Age')
@@ -105,11 +73,6 @@ plt.grid()
 
 # Save figure
 figname = 'RShare_Means'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
\ No newline at end of file
+save_figure(FigPath, figname)
+
+show_figure()
\ No newline at end of file
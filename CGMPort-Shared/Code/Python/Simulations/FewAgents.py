@@ -5,29 +5,25 @@ Created on Tue Dec 10 15:09:28 2019
 @author: mateo
 """
 
-import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
 import matplotlib.pyplot as plt
 
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Calibration and solution
-sys.path.append(os.path.realpath('../')) 
+sys.path.append(my_file_path)
 # Loading the parameters from the ../Code/Calibration/params.py script
 from Calibration.params import dict_portfolio, time_params
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
 
-agent = cpm.PortfolioConsumerType(**dict_portfolio)
-agent.solve()
+agent = solve_cached(dict_portfolio)
 
 
 
@@ -60,14 +56,9 @@ plt.grid()
 
 # Save figure
 figname = 'Y_Sim'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
+save_figure(FigPath, figname)
 
-plt.ioff()
-plt.draw()
-plt.pause(1)
+show_figure()
 
 plt.figure()
 plt.plot(agent.t_age_hist+time_params['Age_born'], agent.RiskyShareNow_hist,'.')
@@ -78,11 +69,6 @@ plt.grid()
 
 # Save figure
 figname = 'RShare_Sim'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
\ No newline at end of file
+save_figure(FigPath, figname)
+
+show_figure()
\ No newline at end of file
@@ -5,46 +5,46 @@ Created on Fri Oct 25 09:56:06 2019
 @author: Mateo
 """
 
-import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
 import matplotlib.pyplot as plt
 import numpy as np
 
 # %% Set up figure path
 import sys,os
 
-# Determine if this is being run as a standalone script
-if __name__ == '__main__':
-    # Running as a script
-    my_file_path = os.path.abspath("../")
-else:
-    # Running from do_ALL
-    my_file_path = os.path.dirname(os.path.abspath("do_ALL.py"))
+# Code/Python, found from the location of this file so that the script can
+# be run from any folder, on its own or from do_ALL
+my_file_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 FigPath = os.path.join(my_file_path,"Figures/")
 
 # %% Calibration and solution
 
-sys.path.append(os.path.realpath('../')) 
+sys.path.append(my_file_path)
 # Loading the parameters from the ../Code/Calibration/params.py script
 from Calibration.params import dict_portfolio, time_params, norm_factor
+from Tools.cache import solve_cached
+from Tools.figures import save_figure, show_figure
+from Tools.tables import PolicyTable
 
-agent = cpm.PortfolioConsumerType(**dict_portfolio)
-agent.solve()
+agent = solve_cached(dict_portfolio)
 
 # %%
-# Plot portfolio rule
+# Tabulate the policy functions at every age on the wealth grid used for plots
 eevalgrid = np.linspace(0,300,100)
+age_born = time_params['Age_born']
+table = PolicyTable(agent.solution, norm_factor, eevalgrid, age_born = age_born)
+
+# Plot portfolio rule
 
 # In the last period of life you consume everything
 # so portfolio choice is irrelevant
 
 # Ages
 ages = [20,30,55,75]
-age_born = time_params['Age_born']
 plt.figure()
 for a in ages:
     plt.plot(eevalgrid,
-             agent.solution[a-age_born].RiskyShareFunc[0][0](eevalgrid/norm_factor[a-age_born]),
+             table.RiskyShareFunc(a, eevalgrid),
              label = 'Age = %i' %(a))
 plt.xlabel('Wealth')
 plt.ylabel('Risky portfolio share')
@@ -53,21 +53,16 @@ plt.grid()
 
 # Save figure
 figname = 'RShare_Pol'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
+save_figure(FigPath, figname)
 
-plt.ioff()
-plt.draw()
-plt.pause(1)
+show_figure()
 
 # Plot consumption function
 plt.figure()
 ages = [20,35,65,85]
 for a in ages:
     plt.plot(eevalgrid,
-             agent.solution[a-age_born].cFunc[0][0](eevalgrid/norm_factor[a-age_born])*norm_factor[a-age_born],
+             table.cFunc(a, eevalgrid),
              label = 'Age = %i' %(a))
 plt.xlabel('Wealth')
 plt.ylabel('Consumption')
@@ -76,11 +71,6 @@ plt.grid()
 
 # Save figure
 figname = 'Cons_Pol'
-plt.savefig(os.path.join(FigPath, figname + '.png'))
-plt.savefig(os.path.join(FigPath, figname + '.jpg'))
-plt.savefig(os.path.join(FigPath, figname + '.pdf'))
-plt.savefig(os.path.join(FigPath, figname + '.svg'))
-
-plt.ioff()
-plt.draw()
-plt.pause(1)
\ No newline at end of file
+save_figure(FigPath, figname)
+
+show_figure()
\ No newline at end of file
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed results for the CGM_REMARK notebook.
+
+The notebook solves the model and simulates a cohort before it can show any
+figure, which takes minutes on a shared Binder machine. The results it plots
+(tabulated policies, a few simulated lives and the age profiles of a large
+cohort) are small, so they are bundled with the notebook as a single .npz
+file in Code/Python/Results, stored along with a key: a hash of the
+calibration (Tools.cache.calibration_hash, which includes HARK's version), of
+the settings of the grids and simulations, of the source of the modules that
+compute them (artifact_modules) and of artifact_version. The
+notebook loads the arrays when the key matches and only computes them
+otherwise, in which case it stores them in Code/Python/Cache so that later
+kernels can load them too.
+
+To refresh the bundled file after changing the calibration, the notebook or
+those modules, run the notebook once and pass path=ResultsPath to save_artifact (or copy the
+file from Cache to Results).
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from Tools.cache import CachePath, calibration_hash, _hash_value
+
+# Folder with the artifacts bundled with the code (Code/Python/Results)
+ResultsPath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'Results')
+
+# Bump this whenever the contents of the artifacts change
+artifact_version = 3
+
+# Modules of Tools whose code the results are computed with: the simulation
+# of the cohort (and its draws) and the tabulation of the policies
+artifact_modules = ['cohort', 'variance', 'tables', 'panel']
+
+ToolsPath = os.path.dirname(os.path.abspath(__file__))
+
+def code_hash(modules=artifact_modules):
+    '''
+    Hash of the source of the given modules of Tools, with line endings
+    normalized so that it does not depend on the platform of the checkout.
+    '''
+    h = hashlib.sha1()
+    for name in modules:
+        with open(os.path.join(ToolsPath, name + '.py'), 'rb') as f:
+            h.update(f.read().replace(b'\r\n', b'\n'))
+    return h.hexdigest()
+
+def artifact_key(params, spec):
+    '''
+    Hash that identifies the results computed from a calibration and from the
+    settings of the computations, with the current code (see code_hash).
+
+    Parameters
+    ----------
+    params : dict
+        Dictionary of parameters used to create a PortfolioConsumerType.
+    spec : dict
+        Other settings that the results depend on, such as grids, numbers of
+        agents and seeds. Values must be numbers, strings, arrays, lists or
+        dictionaries.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal digest.
+    '''
+    h = hashlib.sha1()
+    h.update(('artifact %i' % artifact_version).encode())
+    h.update(calibration_hash(params).encode())
+    h.update(code_hash().encode())
+    _hash_value(h, spec)
+    return h.hexdigest()
+
+def artifact_file(name, path=ResultsPath):
+    return os.path.join(path, name + '_v%i.npz' % artifact_version)
+
+def load_artifact(name, params, spec, paths=None):
+    '''
+    Returns the arrays of an artifact computed with the given calibration and
+    settings, as a dictionary, or None if there is none.
+
+    Parameters
+    ----------
+    name : str
+        Name of the artifact.
+    params : dict
+        The calibration.
+    spec : dict
+        The settings of the computations (see artifact_key).
+    paths : [str]
+        Folders to look in, in order. Defaults to the bundled artifacts and
+        then the cache.
+
+    Returns
+    -------
+    arrays : dict or None
+        The stored arrays.
+    '''
+    if paths is None:
+        paths = [ResultsPath, CachePath]
+    key = artifact_key(params, spec)
+
+    for path in paths:
+        fname = artifact_file(name, path)
+        if not os.path.exists(fname):
+            continue
+        with np.load(fname) as stored:
+            if str(stored['key']) == key:
+                return dict([(k, stored[k]) for k in stored.files if k != 'key'])
+
+    return None
+
+def save_artifact(name, params, spec, arrays, path=CachePath):
+    '''
+    Stores the arrays of an artifact, along with the key of the calibration
+    and settings they were computed with, in the given folder.
+    '''
+    os.makedirs(path, exist_ok=True)
+    fname = artifact_file(name, path)
+
+    # Write under a temporary name and move in place, as Tools.cache does
+    tmp_name = fname + '.%i.tmp' % os.getpid()
+    with open(tmp_name, 'wb') as f:
+        np.savez_compressed(f, key=artifact_key(params, spec), **arrays)
+    os.replace(tmp_name, fname)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of solved PortfolioConsumerType models.
+
+Every script in this folder solves the same 80-period life cycle model. The
+functions below hash the calibration dictionary (including the arrays and the
+nodes produced by the risky return distribution function) and store the
+resulting solution in Code/Python/Cache, so that only the first script to
+request a given calibration actually solves it.
+"""
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+import HARK
+import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
+
+# Folder in which solutions are stored (Code/Python/Cache)
+CachePath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'Cache')
+
+# Bump this whenever the layout of the stored files changes
+cache_version = 1
+
+# Parameters that only affect simulations and can therefore be left out of
+# the hash of the calibration.
+sim_params = ['AgentCount', 'T_sim', 'pLvlInitMean', 'pLvlInitStd',
+              'aNrmInitMean', 'aNrmInitStd', 'PermGroFacAgg', 'drawRiskyFunc']
+
+# %% Hashing
+
+def _hash_value(h, value):
+    '''
+    Feeds a parameter value into a hashlib object in a way that does not depend
+    on its container type (list vs. array) or on floating point formatting.
+    '''
+    if value is None:
+        h.update(b'None')
+    elif isinstance(value, (bool, np.bool_)):
+        h.update(repr(bool(value)).encode())
+    elif isinstance(value, (int, float, np.integer, np.floating)):
+        h.update(np.float64(value).tobytes())
+    elif isinstance(value, str):
+        h.update(value.encode())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        value = np.ascontiguousarray(value, dtype=np.float64)
+        h.update(repr(value.shape).encode())
+        h.update(value.tobytes())
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        h.update(b'[')
+        for x in value:
+            _hash_value(h, x)
+        h.update(b']')
+    elif isinstance(value, dict):
+        h.update(b'{')
+        for key in sorted(value):
+            h.update(str(key).encode())
+            _hash_value(h, value[key])
+        h.update(b'}')
+    else:
+        raise ValueError('Can not hash parameter value of type ' +
+                         type(value).__name__)
+
+def calibration_hash(params):
+    '''
+    Computes a hash that identifies the solution implied by a calibration
+    dictionary such as Calibration.params.dict_portfolio.
+
+    Functions can not be hashed directly, so the risky return distribution
+    function is represented by the nodes and probabilities it produces for the
+    requested number of points. Parameters that only matter for simulations
+    are ignored.
+
+    Parameters
+    ----------
+    params : dict
+        Dictionary of parameters used to create a PortfolioConsumerType.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal digest of the calibration.
+    '''
+    h = hashlib.sha1()
+    h.update(('HARK ' + HARK.__version__).encode())
+    h.update(('cache %i' % cache_version).encode())
+
+    for key in sorted(params):
+        if key in sim_params:
+            continue
+
+        value = params[key]
+        if key == 'approxRiskyDstn':
+            value = value(params['RiskyCount'])
+
+        h.update(key.encode())
+        _hash_value(h, value)
+
+    return h.hexdigest()
+
+# %% Loading and storing solutions
+
+def cache_file(params, cache_path=CachePath, AgentType=cpm.PortfolioConsumerType):
+    '''
+    Returns the path of the file that stores (or would store) the solution for
+    the given calibration and agent type.
+    '''
+    return os.path.join(cache_path, AgentType.__name__ + '_' +
+                        calibration_hash(params) + '.pkl')
+
+def load_solution(params, cache_path=CachePath, AgentType=cpm.PortfolioConsumerType):
+    '''
+    Returns the stored solution for the given calibration, or None if it has
+    not been solved before.
+    '''
+    fname = cache_file(params, cache_path, AgentType)
+    if not os.path.exists(fname):
+        return None
+
+    with open(fname, 'rb') as f:
+        return pickle.load(f)
+
+def save_solution(params, solution, cache_path=CachePath,
+                  AgentType=cpm.PortfolioConsumerType):
+    '''
+    Stores a solution (the list agent.solution) for the given calibration.
+    The file is written under a temporary name and then moved in place, so
+    that scripts running at the same time never read a partial file.
+    '''
+    os.makedirs(cache_path, exist_ok=True)
+    fname = cache_file(params, cache_path, AgentType)
+    tmp_name = fname + '.%i.tmp' % os.getpid()
+
+    with open(tmp_name, 'wb') as f:
+        pickle.dump(solution, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_name, fname)
+
+def solve_cached(params, cache_path=CachePath, AgentType=cpm.PortfolioConsumerType):
+    '''
+    Creates an agent with the given calibration and gives it a solution,
+    loading it from disk when the same calibration has been solved before and
+    solving (and storing) it otherwise.
+
+    Parameters
+    ----------
+    params : dict
+        Dictionary of parameters used to create the agent.
+    cache_path : str
+        Folder in which solutions are stored.
+    AgentType : class
+        Agent type to create. PortfolioConsumerType by default.
+
+    Returns
+    -------
+    agent : AgentType
+        An agent whose solution attribute is ready to be used for plots and
+        simulations, exactly as if agent.solve() had been called.
+    '''
+    agent = AgentType(**params)
+
+    solution = load_solution(params, cache_path, AgentType)
+    if solution is None:
+        agent.solve()
+        save_solution(params, agent.solution, cache_path, AgentType)
+    else:
+        agent.solution = solution
+        agent.addToTimeVary('solution')
+
+    return agent
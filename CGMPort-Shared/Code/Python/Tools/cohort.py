@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized simulation of a cohort of agents over their whole life cycle.
+
+HARK simulates a fixed population period by period, replacing agents who
+die, so collecting a few thousand observations per age takes thousands of
+calls to simOnePeriod. Life cycle profiles only need agents of every age, so
+simulate_cohort instead takes N agents born at the same time and pushes them
+through every age of the model at once, with one vectorized step per age.
+
+Every agent lives through all the ages of the model. Survival enters either
+as weights (the probability of being alive at each age, which is the same for
+everyone since mortality does not depend on the agent's state) or as an
+alive mask drawn from the survival probabilities.
+
+The timing of shocks, decisions and newborns follows HARK's
+PortfolioConsumerType, with one exception: the risky return is drawn
+independently for every agent by default, which is what HARK's long
+simulations with death and replacement average over. Pass
+common_returns = True to give the whole cohort the same return history.
+
+Returns are drawn from the agent's own calibration (see agent_risky_draws):
+normal returns for agents whose approxRiskyDstn is normal and says so with
+mu and sigma attributes, as RiskyDstnFunc in Calibration/params.py does, and
+a fine discretization of the agent's approxRiskyDstn otherwise.
+"""
+
+import numpy as np
+
+import Calibration.params as base_calib
+from Tools.egm import from_hark
+from Tools.variance import UniformDraws, discrete_draws, normal_draws
+
+# %% Return draws
+
+class NormalDraws(object):
+    '''
+    Draws of normally distributed risky returns, as in RiskyDrawFunc in
+    Calibration/params.py but vectorized over agents.
+    '''
+
+    def __init__(self, mu, sigma):
+        self.mu = mu
+        self.sigma = sigma
+
+    def __call__(self, N, RNG):
+        return RNG.normal(self.mu, self.sigma, N)
+
+    def ppf(self, u):
+        '''
+        Draws that correspond to the uniforms u, for variance reduced
+        sampling (see Tools.variance).
+        '''
+        return normal_draws(self.mu, self.sigma, u)
+
+class DiscreteDraws(object):
+    '''
+    Draws of risky returns from a discrete distribution, such as a fine
+    discretization of an agent's approxRiskyDstn. Draws are made by inversion
+    of the cumulative probabilities, as for income shocks.
+    '''
+
+    def __init__(self, prob, values):
+        order = np.argsort(values)
+        self.prob = np.asarray(prob)[order]
+        self.values = np.asarray(values)[order]
+
+    def __call__(self, N, RNG):
+        return self.ppf(RNG.random(N))
+
+    def ppf(self, u):
+        '''
+        Draws that correspond to the uniforms u, for variance reduced
+        sampling (see Tools.variance).
+        '''
+        return self.values[discrete_draws(self.prob, np.asarray(u))]
+
+# Number of points of the discretized return distributions of agents whose
+# returns are not known to be normal. HARK's Gauss-Hermite
+# nodes (approxNormal) overflow with many more.
+risky_draw_count = 200
+
+def agent_risky_draws(agent, count=risky_draw_count):
+    '''
+    Draws of the risky return factor from the agent's own calibration.
+
+    Parameters
+    ----------
+    agent : PortfolioConsumerType
+        An agent, or an object such as Tools.parallel.CohortInputs with the
+        draws in its RiskyDraw attribute.
+    count : int
+        Number of points of the discretized distribution.
+
+    Returns
+    -------
+    RiskyDraw : NormalDraws or DiscreteDraws
+        Normal draws if the agent's approxRiskyDstn has mu and sigma
+        attributes (as RiskyDstnFunc in Calibration/params.py), or draws from
+        approxRiskyDstn(count) otherwise.
+    '''
+    RiskyDraw = getattr(agent, 'RiskyDraw', None)
+    if RiskyDraw is not None:
+        return RiskyDraw
+    RiskyDstn = agent.approxRiskyDstn
+    if hasattr(RiskyDstn, 'mu') and hasattr(RiskyDstn, 'sigma'):
+        return NormalDraws(RiskyDstn.mu, RiskyDstn.sigma)
+    prob, values = agent.approxRiskyDstn(count)
+    return DiscreteDraws(prob, values)
+
+# %% Simulation
+
+def cohort_ages(T):
+    '''
+    Ages (in years) of the T periods of a simulated cohort. As in HARK, where
+    t_age_hist is recorded after agents age, the period that uses the policy
+    functions in solution[t] is labelled with the age reached at its end,
+    Age_born + t + 1.
+    '''
+    return base_calib.time_params['Age_born'] + 1 + np.arange(T)
+
+class CohortHistory(object):
+    '''
+    The simulated histories of a cohort. Histories are stored, as HARK's
+    *_hist arrays, in arrays with one row per age and one column per agent,
+    under the names of HARK's track_vars: mNrmNow, cNrmNow, aNrmNow, pLvlNow
+    and RiskyShareNow.
+
+    Attributes
+    ----------
+    ages : np.array
+        Age (in years) of every row, labelled as in HARK's simulations
+        (t_age_hist + Age_born, see cohort_ages): row t uses the policy
+        functions in solution[t] and is labelled Age_born + t + 1.
+    weight : np.array
+        Probability of being alive at every age.
+    alive : np.array
+        Boolean (ages x agents) array that says which agents are alive, or
+        None when survival is handled with weights.
+    units : np.array
+        Index of the independent unit that every agent belongs to: the agent
+        itself, its antithetic pair or its Sobol replicate (see
+        Tools.variance.age_estimates).
+    '''
+
+    def __init__(self, ages, weight, alive, hist, units=None):
+        self.ages = ages
+        self.weight = weight
+        self.alive = alive
+        if units is None and len(hist) > 0:
+            units = np.arange(next(iter(hist.values())).shape[1])
+        self.units = units
+        for name, values in hist.items():
+            setattr(self, name + '_hist', values)
+
+    def age_mean(self, values):
+        '''
+        Mean of an (ages x agents) array at every age, conditional on survival.
+        '''
+        if self.alive is None:
+            return values.mean(axis=1)
+        return np.nansum(np.where(self.alive, values, 0.0), axis=1) / \
+               self.alive.sum(axis=1)
+
+    def age_quantile(self, values, q):
+        '''
+        Quantile q of an (ages x agents) array at every age, conditional on
+        survival.
+        '''
+        if self.alive is None:
+            return np.quantile(values, q, axis=1)
+        return np.nanquantile(np.where(self.alive, values, np.nan), q, axis=1)
+
+def simulate_cohort(agent, N, seed=0, survival='weights', RiskyDraw=None,
+                    common_returns=False, sampling='mc', replicates=16,
+                    shocks=None, risky_common=None,
+                    track_vars=['mNrmNow', 'cNrmNow', 'aNrmNow', 'pLvlNow',
+                                'RiskyShareNow'],
+                    aggregator=None, recorder=None):
+    '''
+    Simulates a cohort of N agents from birth until the last period of life.
+
+    Parameters
+    ----------
+    agent : PortfolioConsumerType
+        A solved agent: its solution, income distributions, growth factors,
+        survival probabilities and initial conditions are used.
+    N : int
+        Number of agents in the cohort.
+    seed : int or np.random.SeedSequence
+        Seed of the random number generator.
+    survival : str
+        'weights' to keep every agent alive and report survival probabilities
+        or 'mask' to also draw which agents are alive at every age.
+    RiskyDraw : function
+        Function (N, RNG) -> array of N draws of the risky return factor.
+        Defaults to draws from the agent's own return distribution (see
+        agent_risky_draws). Sampling other than 'mc' and shock panels also
+        need a ppf(u) method, as NormalDraws and DiscreteDraws have.
+    common_returns : bool
+        If True, every agent gets the same return draw at each age.
+    sampling : str
+        How the shocks are drawn: 'mc' for independent draws, or
+        'antithetic' or 'sobol' for variance reduced sampling (see
+        Tools.variance).
+    replicates : int
+        Number of independent replicates with Sobol sampling.
+    shocks : ShockPanel
+        Optional pre-drawn Tools.shocks.ShockPanel with N agents. If given,
+        shocks are taken from it instead of being drawn, and seed, sampling
+        and replicates are ignored (except for deaths with survival = 'mask',
+        when the panel has no draws for them). Its return uniforms are
+        inverted with RiskyDraw.ppf.
+    risky_common : np.array
+        Optional uniform draws of the common return at every age, used with
+        common_returns = True (and no shock panel) instead of drawing them, so
+        that several cohorts can share one return history.
+    track_vars : [str]
+        Variables whose histories are stored.
+    aggregator : AgeMoments
+        Optional Tools.moments.AgeMoments that is fed the variables of every
+        age as they are simulated (with the alive mask as weights, if there is
+        one). Besides the variables in track_vars, it can track market
+        resources and consumption in levels, mLvlNow and cLvlNow. With an
+        aggregator, track_vars can be empty so that no history is stored.
+    recorder : HistoryRecorder
+        Optional Tools.history.HistoryRecorder that stores compact histories
+        of some variables (including mLvlNow, cLvlNow, t_age and alive) at the
+        ages it records.
+
+    Returns
+    -------
+    history : CohortHistory
+        The simulated histories.
+    '''
+    RNG = np.random.default_rng(seed)
+    if RiskyDraw is None:
+        RiskyDraw = agent_risky_draws(agent)
+
+    T = agent.T_cycle
+    solution = from_hark(agent.solution)
+    hist = dict([(name, np.zeros((T, N))) for name in track_vars])
+
+    if shocks is None:
+        Uniforms = UniformDraws(sampling, N, RNG, replicates)
+        units = Uniforms.units
+    elif shocks.N != N or shocks.T < T:
+        raise ValueError('The shock panel does not have N agents and T_cycle ages.')
+    else:
+        units = shocks.units
+
+    # Shocks are drawn directly, or by inversion of uniform draws
+    inverse = shocks is not None or sampling != 'mc'
+
+    # Newborns, with the same initial conditions as in HARK's simBirth
+    if not inverse:
+        aNrm = np.exp(RNG.normal(agent.aNrmInitMean, agent.aNrmInitStd, N))
+        pLvl = np.exp(RNG.normal(agent.pLvlInitMean, agent.pLvlInitStd, N))
+    else:
+        u = Uniforms(2) if shocks is None else np.asarray(shocks.initial)
+        aNrm = np.exp(normal_draws(agent.aNrmInitMean, agent.aNrmInitStd, u[0]))
+        pLvl = np.exp(normal_draws(agent.pLvlInitMean, agent.pLvlInitStd, u[1]))
+    Share = np.zeros(N)
+
+    # Probability of being alive at each age
+    weight = np.concatenate(([1.0], np.cumprod(agent.LivPrb[:T-1])))
+
+    alive = None
+    if survival == 'mask':
+        # Deaths happen at the start of a period, with the survival
+        # probability of the previous one
+        if shocks is None or shocks.survive is None:
+            u = RNG.random((T-1, N))
+        else:
+            u = np.asarray(shocks.survive[:T-1])
+        survives = u < np.asarray(agent.LivPrb[:T-1])[:, np.newaxis]
+        alive = np.vstack((np.ones((1, N), dtype=bool),
+                           np.logical_and.accumulate(survives, axis=0)))
+    elif survival != 'weights':
+        raise ValueError("survival must be 'weights' or 'mask'.")
+
+    ages = cohort_ages(T)
+
+    for t in range(T):
+
+        # Income shocks arriving at age t were drawn from period t-1's
+        # distribution; newborns use the first one and get no transitory shock
+        IncomeDstn = agent.IncomeDstn[max(t-1, 0)]
+        PermGroFac = agent.PermGroFac[max(t-1, 0)]
+        if not inverse:
+            draws = RNG.choice(IncomeDstn[0].size, size=N, p=IncomeDstn[0])
+        else:
+            if shocks is None:
+                u = Uniforms(1 if common_returns else 2)
+            else:
+                u = (shocks.income[t], shocks.risky[t])
+            draws = discrete_draws(IncomeDstn[0], u[0])
+        PermShk = IncomeDstn[1][draws]*PermGroFac
+        TranShk = IncomeDstn[2][draws] if t > 0 else np.ones(N)
+
+        # Returns on last period's portfolio
+        if common_returns and shocks is not None:
+            Risky = RiskyDraw.ppf(shocks.risky_common[t:t+1])
+        elif common_returns and risky_common is not None:
+            Risky = RiskyDraw.ppf(risky_common[t:t+1])
+        elif not inverse or common_returns:
+            Risky = RiskyDraw(1 if common_returns else N, RNG)
+        else:
+            Risky = RiskyDraw.ppf(u[1])
+        Rport = agent.Rfree + Share*(Risky - agent.Rfree)
+
+        # States, controls and post-decision states
+        pLvl = pLvl*PermShk
+        mNrm = aNrm*Rport/PermShk + TranShk
+        cNrm = solution[t].cFunc[0][0](mNrm)
+        aNrm = mNrm - cNrm
+        Share = solution[t].RiskyShareFunc[0][0](aNrm)
+
+        now = {'mNrmNow': mNrm, 'cNrmNow': cNrm, 'aNrmNow': aNrm,
+               'pLvlNow': pLvl, 'RiskyShareNow': Share}
+        for name in track_vars:
+            hist[name][t] = now[name]
+
+        if aggregator is not None or recorder is not None:
+            now['mLvlNow'] = mNrm*pLvl
+            now['cLvlNow'] = cNrm*pLvl
+        if aggregator is not None:
+            aggregator.update(ages[t], now, None if alive is None else alive[t])
+        if recorder is not None:
+            now['alive'] = True if alive is None else alive[t]
+            recorder.record(ages[t], now)
+
+    return CohortHistory(ages, weight, alive, hist, units)
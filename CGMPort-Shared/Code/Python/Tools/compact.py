@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Compact storage of the solution of the life cycle problem.
+
+A solution is a list with one object per age, each holding its own policy
+function objects and copies of their grids. A CompactSolution stores the same
+piecewise linear policies of every age in a few contiguous (ages x
+gridpoints) arrays: the market resources and consumption gridpoints of the
+consumption function, the end-of-period assets and share gridpoints of the
+risky share function, the number of gridpoints of every age (grids of
+different lengths are padded with NaN) and the limit of the risky share, if
+its extrapolation decays towards one.
+
+The arrays can be stored in single precision, saved as a folder of .npy files
+and memory mapped back, so that the solutions of large sweeps of parameters
+fit in memory and can be shared between processes without copies. Indexing a
+CompactSolution returns a thin view of one age that behaves like a
+Tools.egm.CGMSolution: both solution[t].cFunc(m) and solution[t].cFunc[0][0](m)
+work, so views can be used by Tools.cohort, Tools.tables and the other tools
+that read solutions.
+"""
+
+import os
+
+import numpy as np
+
+from Tools.egm import ConsumptionPolicy, LinearPolicy, from_hark
+
+# Arrays that make up a compact solution
+compact_arrays = ['mGrid', 'cGrid', 'mCount', 'aGrid', 'ShareGrid', 'aCount',
+                  'ShareLimit']
+
+# %% Views of one age
+
+class ConsumptionView(ConsumptionPolicy):
+    '''
+    Consumption function of one age of a CompactSolution. Indexing returns
+    the function itself, so that cFunc[0][0] works as in HARK's solutions.
+    '''
+
+    def __getitem__(self, i):
+        return self
+
+class ShareView(LinearPolicy):
+    '''
+    Risky share function of one age of a CompactSolution. Indexing returns
+    the function itself, so that RiskyShareFunc[0][0] works as in HARK's
+    solutions.
+    '''
+
+    def __getitem__(self, i):
+        return self
+
+class CompactPeriod(object):
+    '''
+    A view of one age of a CompactSolution. Its grids are slices of the
+    solution's arrays (converted to double precision when the policies are
+    built, if they are stored in single precision).
+    '''
+
+    def __init__(self, compact, t):
+        m_count = int(compact.mCount[t])
+        a_count = int(compact.aCount[t])
+        self.mGrid = compact.mGrid[t, :m_count]
+        self.cGrid = compact.cGrid[t, :m_count]
+        self.aGrid = compact.aGrid[t, :a_count]
+        self.ShareGrid = compact.ShareGrid[t, :a_count]
+
+        limit = compact.ShareLimit[t]
+        limit = None if np.isnan(limit) else float(limit)
+
+        self.cFunc = ConsumptionView(self.mGrid, self.cGrid)
+        self.RiskyShareFunc = ShareView(self.aGrid, self.ShareGrid, limit=limit)
+
+# %% Solutions
+
+class CompactSolution(object):
+    '''
+    The policy functions of every age stored in contiguous arrays.
+
+    Attributes
+    ----------
+    mGrid, cGrid : np.array
+        (ages x gridpoints) arrays with the gridpoints of the consumption
+        functions, padded with NaN.
+    mCount : np.array
+        Number of consumption gridpoints of every age.
+    aGrid, ShareGrid : np.array
+        (ages x gridpoints) arrays with the gridpoints of the risky share
+        functions, padded with NaN.
+    aCount : np.array
+        Number of share gridpoints of every age.
+    ShareLimit : np.array
+        Limit of the risky share of every age, or NaN if it is extrapolated
+        linearly.
+    '''
+
+    def __init__(self, mGrid, cGrid, mCount, aGrid, ShareGrid, aCount, ShareLimit):
+        self.mGrid = mGrid
+        self.cGrid = cGrid
+        self.mCount = mCount
+        self.aGrid = aGrid
+        self.ShareGrid = ShareGrid
+        self.aCount = aCount
+        self.ShareLimit = ShareLimit
+
+    def __len__(self):
+        return self.mCount.shape[0]
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return CompactSolution(**dict([(name, getattr(self, name)[t])
+                                           for name in compact_arrays]))
+        if t < 0:
+            t += len(self)
+        if t < 0 or t >= len(self):
+            raise IndexError('The solution has %i ages.' % len(self))
+        return CompactPeriod(self, t)
+
+    @property
+    def dtype(self):
+        return self.mGrid.dtype
+
+    @property
+    def nbytes(self):
+        return sum([getattr(self, name).nbytes for name in compact_arrays])
+
+    def save(self, path):
+        '''
+        Saves the solution in a folder, with one .npy file per array.
+        '''
+        os.makedirs(path, exist_ok=True)
+        for name in compact_arrays:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+
+def _period_grids(sol):
+    '''
+    Gridpoints and share limit of the policies of one period of a solution:
+    a CGMSolution or a view, or a period of HARK's solution with linear
+    policies (such as its terminal period).
+    '''
+    if hasattr(sol, 'mGrid'):
+        return (sol.mGrid, sol.cGrid, sol.aGrid, sol.ShareGrid,
+                sol.RiskyShareFunc[0][0].limit)
+
+    cFunc = sol.cFunc[0][0]
+    if hasattr(cFunc, 'functions'):
+        cFunc = cFunc.functions[0]
+    ShareFunc = sol.RiskyShareFunc[0][0]
+    limit = ShareFunc.intercept_limit if getattr(ShareFunc, 'decay_extrap', False) else None
+    return cFunc.x_list, cFunc.y_list, ShareFunc.x_list, ShareFunc.y_list, limit
+
+def compact_solution(solution, dtype=np.float64):
+    '''
+    Stores the policies of a solution in a CompactSolution.
+
+    Parameters
+    ----------
+    solution : list
+        The solution of a PortfolioConsumerType (agent.solution), of
+        Tools.egm.solve_cgm or another CompactSolution, ordered by age.
+    dtype : np.dtype
+        Precision of the stored gridpoints: np.float64 or np.float32. Counts
+        are always stored as integers.
+
+    Returns
+    -------
+    compact : CompactSolution
+        The compact solution.
+    '''
+    grids = [_period_grids(sol) for sol in from_hark(solution)]
+
+    T = len(grids)
+    m_points = max([len(g[0]) for g in grids])
+    a_points = max([len(g[2]) for g in grids])
+
+    arrays = {'mGrid': np.full((T, m_points), np.nan, dtype=dtype),
+              'cGrid': np.full((T, m_points), np.nan, dtype=dtype),
+              'mCount': np.zeros(T, dtype=np.int32),
+              'aGrid': np.full((T, a_points), np.nan, dtype=dtype),
+              'ShareGrid': np.full((T, a_points), np.nan, dtype=dtype),
+              'aCount': np.zeros(T, dtype=np.int32),
+              'ShareLimit': np.full(T, np.nan)}
+
+    for t, (mGrid, cGrid, aGrid, ShareGrid, limit) in enumerate(grids):
+        arrays['mGrid'][t, :len(mGrid)] = mGrid
+        arrays['cGrid'][t, :len(mGrid)] = cGrid
+        arrays['mCount'][t] = len(mGrid)
+        arrays['aGrid'][t, :len(aGrid)] = aGrid
+        arrays['ShareGrid'][t, :len(aGrid)] = ShareGrid
+        arrays['aCount'][t] = len(aGrid)
+        if limit is not None:
+            arrays['ShareLimit'][t] = limit
+
+    return CompactSolution(**arrays)
+
+def load_compact_solution(path, mmap_mode='r'):
+    '''
+    Loads a solution stored with CompactSolution.save. With mmap_mode = 'r'
+    (the default) the arrays are memory mapped instead of read into memory.
+    '''
+    return CompactSolution(**dict([(name, np.load(os.path.join(path, name + '.npy'),
+                                                  mmap_mode=mmap_mode))
+                                   for name in compact_arrays]))
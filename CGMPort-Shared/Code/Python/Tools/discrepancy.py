@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Numerical summaries of the differences between HARK's and CGM's policies.
+
+The comparison scripts tabulate HARK's consumption and risky share functions
+on the grid of CGM's Fortran outputs (ages x 401 levels of cash on hand) and
+plot the differences. discrepancy_report summarizes the same differences with
+the maximum absolute error, the root mean squared error and the maximum
+relative error over the whole grid, at every age and within bands of wealth,
+and locates the worst point. write_report stores the summary as JSON and as a
+tidy CSV table, and compare_reports checks a new summary against a stored
+one, so that changes in accuracy can be detected without drawing figures.
+"""
+
+import csv
+import json
+
+import numpy as np
+
+# %% Metrics
+
+def error_metrics(hark, cgm, axis=None):
+    '''
+    Maximum absolute error, root mean squared error and maximum relative error
+    (relative to the size of CGM's value, or absolute where it is smaller than
+    one) of HARK's values with respect to CGM's, along the given axis.
+    '''
+    error = hark - cgm
+    relative = np.abs(error)/np.maximum(np.abs(cgm), 1.0)
+    return {'MaxAbs': np.max(np.abs(error), axis=axis),
+            'RMSE': np.sqrt(np.mean(error**2, axis=axis)),
+            'MaxRel': np.max(relative, axis=axis)}
+
+def discrepancy_report(policies, ages, wealth, bands=[0, 25, 50, 100, 200, np.inf]):
+    '''
+    Summarizes the differences between HARK's and CGM's policy functions.
+
+    Parameters
+    ----------
+    policies : dict
+        Maps the name of each policy (e.g. 'Cons' or 'Share') to a pair of
+        (ages x wealth) arrays: HARK's values and CGM's values.
+    ages : np.array
+        Age of every row.
+    wealth : np.array
+        Wealth level of every column.
+    bands : [float]
+        Edges of the wealth bands. Band i includes levels in
+        [bands[i], bands[i+1]). An infinite last edge is reported as None.
+
+    Returns
+    -------
+    report : dict
+        For every policy: 'Overall' metrics, metrics 'ByAge' and 'ByBand'
+        (lists with one dictionary per age or band) and the 'Worst' point,
+        with the largest absolute error.
+    '''
+    ages = np.asarray(ages)
+    wealth = np.asarray(wealth)
+    report = {}
+    for name, (hark, cgm) in policies.items():
+        hark, cgm = np.asarray(hark, dtype=float), np.asarray(cgm, dtype=float)
+
+        overall = dict([(k, float(v)) for k, v in error_metrics(hark, cgm).items()])
+
+        by_age = error_metrics(hark, cgm, axis=1)
+        worst_col = np.argmax(np.abs(hark - cgm), axis=1)
+        by_age = [dict([('Age', int(age)), ('WorstWealth', float(wealth[worst_col[i]]))] +
+                       [(k, float(v[i])) for k, v in by_age.items()])
+                  for i, age in enumerate(ages)]
+
+        by_band = []
+        for lo, hi in zip(bands[:-1], bands[1:]):
+            cols = (wealth >= lo) & (wealth < hi)
+            if not np.any(cols):
+                continue
+            metrics = error_metrics(hark[:, cols], cgm[:, cols])
+            by_band.append(dict([('WealthFrom', float(lo)),
+                                 ('WealthTo', None if np.isinf(hi) else float(hi)),
+                                 ('Points', int(cols.sum()*ages.size))] +
+                                [(k, float(v)) for k, v in metrics.items()]))
+
+        row, col = np.unravel_index(np.argmax(np.abs(hark - cgm)), hark.shape)
+        worst = {'Age': int(ages[row]), 'Wealth': float(wealth[col]),
+                 'HARK': float(hark[row, col]), 'CGM': float(cgm[row, col])}
+
+        report[name] = {'Overall': overall, 'ByAge': by_age, 'ByBand': by_band,
+                        'Worst': worst}
+
+    return report
+
+# %% Storage
+
+def write_report(report, fname):
+    '''
+    Writes a report to fname.json and, as a tidy table with one row per
+    policy and age, wealth band or the whole grid, to fname.csv.
+    '''
+    with open(fname + '.json', 'w') as f:
+        json.dump(report, f, indent=1)
+
+    fields = ['Policy', 'Group', 'Age', 'WealthFrom', 'WealthTo', 'Points',
+              'MaxAbs', 'RMSE', 'MaxRel', 'WorstWealth']
+    with open(fname + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for name, parts in report.items():
+            writer.writerow(dict(parts['Overall'], Policy=name, Group='Overall'))
+            for row in parts['ByAge']:
+                writer.writerow(dict(row, Policy=name, Group='Age'))
+            for row in parts['ByBand']:
+                writer.writerow(dict(row, Policy=name, Group='Band'))
+
+def compare_reports(report, fname, rtol=1e-6):
+    '''
+    Compares the overall metrics of a report with those stored in a JSON file
+    by write_report.
+
+    Returns
+    -------
+    worse : [str]
+        Descriptions of the metrics that are larger than the stored ones by
+        more than the relative tolerance rtol. Empty if accuracy did not get
+        worse.
+    '''
+    with open(fname) as f:
+        stored = json.load(f)
+
+    worse = []
+    for name, parts in report.items():
+        for metric, value in parts['Overall'].items():
+            old = stored[name]['Overall'][metric]
+            if value > old*(1.0 + rtol) + 1e-12:
+                worse.append('%s %s: %g (was %g)' % (name, metric, value, old))
+    return worse
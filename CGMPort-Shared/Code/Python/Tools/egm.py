@@ -0,0 +1,577 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized backward induction for the CGM life cycle portfolio problem.
+
+HARK's PortfolioConsumerType solves every period with a general, object-heavy
+solver. The problem in Calibration/params.py has a fixed structure (a single
+asset grid, a joint quadrature over permanent, transitory and return shocks
+and a grid of risky shares), so each period can be solved with a handful of
+array operations: the first order condition for the share is evaluated over
+the whole (asset x share x shock) tensor at once, and consumption follows from
+the endogenous grid method.
+
+The solution mimics HARK's: solution[t].cFunc[0][0] and
+solution[t].RiskyShareFunc[0][0] are callable policy functions of normalized
+market resources and normalized end-of-period assets respectively. They can
+therefore be used for plots and also handed to a PortfolioConsumerType for
+simulation:
+
+    agent = cpm.PortfolioConsumerType(**dict_portfolio)
+    agent.solution = solve_cgm(dict_portfolio)
+    agent.addToTimeVary('solution')
+"""
+
+import numpy as np
+
+import HARK.ConsumptionSaving.ConsPortfolioModel as cpm
+from HARK.utilities import combineIndepDstns
+
+# %% Policy functions
+
+class LinearPolicy(object):
+    '''
+    A piecewise linear function that behaves like HARK's LinearInterp: it is
+    NaN below the first gridpoint and is extrapolated linearly above the last
+    one, or decays towards a horizontal limit if one is given.
+    '''
+
+    def __init__(self, x_list, y_list, limit=None):
+        self.x_list = np.asarray(x_list, dtype=float)
+        self.y_list = np.asarray(y_list, dtype=float)
+
+        # Slope of the last segment, used for extrapolation
+        self.slope_top = (self.y_list[-1] - self.y_list[-2]) / \
+                         (self.x_list[-1] - self.x_list[-2])
+
+        # Decay extrapolation towards y = limit, as in LinearInterp with
+        # intercept_limit = limit and slope_limit = 0
+        self.limit = limit
+        if limit is not None:
+            self.decay_A = limit - self.y_list[-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.decay_B = self.slope_top/self.decay_A
+
+    def _eval(self, x):
+        y = np.interp(x, self.x_list, self.y_list)
+
+        above = x > self.x_list[-1]
+        if np.any(above):
+            dx = x[above] - self.x_list[-1]
+            if self.limit is None:
+                y[above] = self.y_list[-1] + self.slope_top*dx
+            else:
+                y[above] = self.limit - self.decay_A*np.exp(-self.decay_B*dx)
+
+        y[x < self.x_list[0]] = np.nan
+        return y
+
+    def _der(self, x):
+        i = np.clip(np.searchsorted(self.x_list, x), 1, self.x_list.size - 1)
+        dydx = (self.y_list[i] - self.y_list[i-1]) / \
+               (self.x_list[i] - self.x_list[i-1])
+
+        above = x > self.x_list[-1]
+        if np.any(above) and self.limit is not None:
+            dx = x[above] - self.x_list[-1]
+            dydx[above] = self.decay_B*self.decay_A*np.exp(-self.decay_B*dx)
+
+        dydx[x < self.x_list[0]] = np.nan
+        return dydx
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=float)
+        return self._eval(x.reshape(-1)).reshape(x.shape)
+
+    def derivative(self, x):
+        x = np.asarray(x, dtype=float)
+        return self._der(x.reshape(-1)).reshape(x.shape)
+
+    def eval_with_derivative(self, x):
+        return self(x), self.derivative(x)
+
+class ConsumptionPolicy(LinearPolicy):
+    '''
+    Consumption function: linear interpolation of the unconstrained (EGM)
+    solution capped by the borrowing constraint c <= m, as HARK's
+    LowerEnvelope of the two.
+    '''
+
+    def _eval(self, x):
+        return np.minimum(LinearPolicy._eval(self, x), x)
+
+    def _der(self, x):
+        dydx = LinearPolicy._der(self, x)
+        cnst = LinearPolicy._eval(self, x) > x
+        dydx[cnst] = 1.0
+        return dydx
+
+class CGMSolution(object):
+    '''
+    The solution to one period of the problem. The policy functions are
+    wrapped in nested lists so that solution.cFunc[0][0] and
+    solution.RiskyShareFunc[0][0] work as they do with HARK's
+    PortfolioSolution. The gridpoints that define them are kept as arrays,
+    along with the number of evaluations of the first order condition for the
+    share that the period took to solve.
+    '''
+
+    def __init__(self, mGrid, cGrid, aGrid, ShareGrid, ShareLimit=None):
+        self.FOCevals = 0
+        self.mGrid = mGrid
+        self.cGrid = cGrid
+        self.aGrid = aGrid
+        self.ShareGrid = ShareGrid
+
+        self.cFunc = [[ConsumptionPolicy(mGrid, cGrid)]]
+        self.RiskyShareFunc = [[LinearPolicy(aGrid, ShareGrid, limit=ShareLimit)]]
+
+def from_hark(solution):
+    '''
+    Converts the solution of a HARK PortfolioConsumerType into CGMSolutions
+    with the same (piecewise linear) policy functions, which are much faster
+    to evaluate on large arrays. Periods that cannot be converted, such as
+    HARK's terminal period, are returned unchanged, as are CGMSolutions.
+    '''
+    converted = []
+    for sol in solution:
+        try:
+            cFunc = sol.cFunc[0][0].functions[0]
+            ShareFunc = sol.RiskyShareFunc[0][0]
+            ShareLimit = ShareFunc.intercept_limit if ShareFunc.decay_extrap else None
+            converted.append(CGMSolution(cFunc.x_list, cFunc.y_list,
+                                         ShareFunc.x_list, ShareFunc.y_list,
+                                         ShareLimit))
+        except AttributeError:
+            converted.append(sol)
+
+    return converted
+
+# %% Inputs
+
+def make_shock_dstns(agent, dedupe=True):
+    '''
+    Builds the joint discrete distribution of next period's permanent,
+    transitory and risky return shocks for every period of an agent's life.
+
+    In the CGM calibration most periods share the same income distribution
+    (shock sizes are constant during working life and shocks are off after
+    retirement), and the return distribution never changes. With dedupe=True,
+    the joint distribution is built once for each distinct income distribution
+    and the same arrays are shared by reference by every period that uses it.
+
+    Parameters
+    ----------
+    agent : PortfolioConsumerType
+        An agent created from a calibration dictionary. It does not need to be
+        solved.
+    dedupe : bool
+        Whether to build each distinct joint distribution only once.
+
+    Returns
+    -------
+    ShockDstn : [[np.array]]
+        A list with T_cycle elements, each a list of four arrays: probabilities,
+        permanent shocks, transitory shocks and risky return factors.
+    '''
+    RiskyDstn = agent.approxRiskyDstn(agent.RiskyCount)
+
+    ShockDstns = []
+    built = {}
+    for t, IncomeDstn in enumerate(agent.IncomeDstn):
+        if dedupe:
+            key = tuple(np.asarray(x, dtype=float).tobytes() for x in IncomeDstn)
+        else:
+            key = t
+        if key not in built:
+            built[key] = combineIndepDstns(IncomeDstn, RiskyDstn)
+        ShockDstns.append(built[key])
+
+    return ShockDstns
+
+def dstn_memory(ShockDstns):
+    '''
+    Memory used by a list of shock distributions.
+
+    Returns
+    -------
+    used : int
+        Bytes held by the arrays, counting those shared by several periods once.
+    unshared : int
+        Bytes that the arrays would take if every period had its own copy.
+    '''
+    arrays = [x for ShockDstn in ShockDstns for x in ShockDstn]
+    unshared = sum([x.nbytes for x in arrays])
+    used = sum(dict([(id(x), x.nbytes) for x in arrays]).values())
+    return used, unshared
+
+# %% Solution
+
+def marg_value(c, CRRA):
+    '''
+    Marginal utility c^-CRRA, computed in place through logarithms, which is
+    considerably faster than a floating point power for large arrays.
+    '''
+    np.log(c, out=c)
+    c *= -CRRA
+    return np.exp(c, out=c)
+
+def calc_share_FOC(aGrid, ShareGrid, ShockDstn, Rfree, PermGroFac, CRRA, cFuncNext):
+    '''
+    Evaluates the first order condition of the portfolio problem,
+    E[(R - Rfree) * psi^-CRRA * vP'(m')], at every combination of end-of-period
+    assets and risky share.
+
+    ShareGrid can be a vector of shares common to every asset level or a
+    matrix with one row of shares per asset gridpoint.
+
+    Returns
+    -------
+    FOC : np.array
+        Array of shape (aGrid.size, number of shares).
+    '''
+    ShkPrbs, PermShk, TranShk, Risky = ShockDstn
+    Rtilde = Risky - Rfree
+
+    # Next period's market resources, shape (aGrid.size, shares, shocks)
+    Reff = Rfree + ShareGrid[..., np.newaxis]*Rtilde
+    if ShareGrid.ndim == 1:
+        mNext = np.multiply.outer(aGrid, Reff/(PermGroFac*PermShk))
+    else:
+        mNext = aGrid[:, np.newaxis, np.newaxis]*(Reff/(PermGroFac*PermShk))
+    mNext += TranShk
+
+    return np.dot(marg_value(cFuncNext(mNext), CRRA), ShkPrbs*Rtilde*PermShk**(-CRRA))
+
+def find_share(FOC, ShareGrid):
+    '''
+    Finds the risky share that sets the (linearly interpolated) first order
+    condition to zero at every asset gridpoint. The share is 1 where the
+    condition is still positive at 1 and 0 where it is already negative at 0.
+    ShareGrid can also be a matrix with the shares used in each row of FOC.
+    '''
+    Share = np.zeros(FOC.shape[0])
+
+    all_in = FOC[:, -1] >= 0.0
+    none_in = FOC[:, 0] < 0.0
+    Share[all_in] = 1.0
+
+    inner = np.logical_not(np.logical_or(all_in, none_in))
+    if np.any(inner):
+        FOCin = FOC[inner]
+        # First gridpoint at which the condition turns negative
+        j = np.argmax(FOCin < 0.0, axis=1)
+        rows = np.arange(FOCin.shape[0])
+        lo = FOCin[rows, j-1]
+        hi = FOCin[rows, j]
+        if ShareGrid.ndim == 1:
+            Slo, Shi = ShareGrid[j-1], ShareGrid[j]
+        else:
+            Slo, Shi = ShareGrid[inner][rows, j-1], ShareGrid[inner][rows, j]
+        Share[inner] = Slo + (Shi - Slo)*lo/(lo - hi)
+
+    return Share
+
+def find_share_warm(aGrid, ShareGrid, ShareGuess, ShockDstn, Rfree, PermGroFac,
+                    CRRA, cFuncNext, width=2):
+    '''
+    Finds the same risky shares as find_share, but starting from a guess for
+    every asset gridpoint (e.g. the solution of a nearby calibration). The first
+    order condition is evaluated only in a window of 2*width gridpoints of
+    ShareGrid around each guess. Asset gridpoints whose root is not bracketed
+    by their window move it towards the root until it is.
+
+    Since the condition is decreasing in the share, the result is identical to
+    searching over the whole grid. width must be at least 1.
+
+    Returns
+    -------
+    Share : np.array
+        Optimal risky share at every asset gridpoint.
+    evals : int
+        Number of (asset, share) points at which the condition was evaluated.
+    '''
+    if width < 1:
+        raise ValueError('The search windows need a width of at least 1.')
+
+    n = ShareGrid.size
+    k = min(2*width, n)
+    nodes = np.arange(k)
+
+    # Start each window so that the guess is near its middle
+    j = np.searchsorted(ShareGrid, ShareGuess, side='right') - 1
+    start = np.clip(j - width + 1, 0, n - k)
+
+    Share = np.zeros(aGrid.size)
+    todo = np.arange(aGrid.size)
+    evals = 0
+    while todo.size > 0:
+        idx = start[todo, np.newaxis] + nodes
+        FOC = calc_share_FOC(aGrid[todo], ShareGrid[idx], ShockDstn, Rfree,
+                             PermGroFac, CRRA, cFuncNext)
+        evals += FOC.size
+
+        # Roots below or above the window, unless it already is at the corner
+        below = np.logical_and(FOC[:, 0] < 0.0, start[todo] > 0)
+        above = np.logical_and(FOC[:, -1] >= 0.0, start[todo] < n - k)
+        done = np.logical_not(np.logical_or(below, above))
+
+        Share[todo[done]] = find_share(FOC[done], ShareGrid[idx[done]])
+
+        # Slide the remaining windows, keeping one node of overlap
+        start[todo[below]] = np.maximum(start[todo[below]] - (k - 1), 0)
+        start[todo[above]] = np.minimum(start[todo[above]] + (k - 1), n - k)
+        todo = todo[np.logical_not(done)]
+
+    return Share, evals
+
+def calc_share_FOC_der(aGrid, Share, ShockDstn, Rfree, PermGroFac, CRRA, cFuncNext):
+    '''
+    Evaluates the first order condition of the portfolio problem and its
+    derivative with respect to the share, at one share per asset gridpoint.
+
+    Returns
+    -------
+    FOC : np.array
+        The condition at every (aGrid[i], Share[i]).
+    dFOC : np.array
+        Its derivative with respect to the share.
+    '''
+    ShkPrbs, PermShk, TranShk, Risky = ShockDstn
+    Rtilde = Risky - Rfree
+    weights = ShkPrbs*Rtilde*PermShk**(-CRRA)
+
+    # Next period's market resources and their derivative w.r.t. the share
+    dmdS = aGrid[:, np.newaxis]*(Rtilde/(PermGroFac*PermShk))
+    mNext = aGrid[:, np.newaxis]*((Rfree + Share[:, np.newaxis]*Rtilde)/(PermGroFac*PermShk))
+    mNext += TranShk
+
+    c, cP = cFuncNext.eval_with_derivative(mNext)
+    vPP = -CRRA*cP/c
+    vP = marg_value(c, CRRA)
+    vPP *= vP
+
+    return np.dot(vP, weights), np.dot(vPP*dmdS, weights)
+
+def find_share_root(aGrid, ShockDstn, Rfree, PermGroFac, CRRA, cFuncNext,
+                    ShareGuess=None, tol=1e-8, maxiter=50):
+    '''
+    Finds the risky share that sets the first order condition to zero at every
+    asset gridpoint with a safeguarded Newton method, applied to the whole
+    grid at once. Corner solutions are detected first by evaluating the
+    condition at shares 0 and 1, which also provides the initial bracket.
+    Newton steps that leave the bracket are replaced by bisection.
+
+    Parameters
+    ----------
+    ShareGuess : np.array
+        Starting points for the iterations. If not given, the iterations start
+        at the root of the line joining the condition at 0 and 1.
+    tol : float
+        Iterations stop for an asset gridpoint when the share moves by less
+        than tol.
+    maxiter : int
+        Maximum number of Newton iterations.
+
+    Returns
+    -------
+    Share : np.array
+        Optimal risky share at every asset gridpoint.
+    evals : int
+        Number of (asset, share) points at which the condition was evaluated.
+    '''
+    Ends = calc_share_FOC(aGrid, np.array([0.0, 1.0]), ShockDstn, Rfree,
+                          PermGroFac, CRRA, cFuncNext)
+    evals = Ends.size
+
+    Share = np.zeros(aGrid.size)
+    all_in = Ends[:, 1] >= 0.0
+    none_in = Ends[:, 0] < 0.0
+    Share[all_in] = 1.0
+
+    # Interior solutions, bracketed by [lo, hi]
+    rows = np.where(np.logical_not(np.logical_or(all_in, none_in)))[0]
+    lo = np.zeros(rows.size)
+    hi = np.ones(rows.size)
+    if ShareGuess is None:
+        S = Ends[rows, 0]/(Ends[rows, 0] - Ends[rows, 1])
+    else:
+        S = np.clip(ShareGuess[rows], 0.0, 1.0)
+
+    for i in range(maxiter):
+        if rows.size == 0:
+            break
+
+        FOC, dFOC = calc_share_FOC_der(aGrid[rows], S, ShockDstn, Rfree,
+                                       PermGroFac, CRRA, cFuncNext)
+        evals += rows.size
+
+        # The condition is decreasing in the share
+        pos = FOC > 0.0
+        lo[pos] = S[pos]
+        hi[~pos] = S[~pos]
+
+        Snew = S - FOC/dFOC
+        bisect = np.logical_not(np.logical_and(Snew >= lo, Snew <= hi))
+        Snew[bisect] = 0.5*(lo[bisect] + hi[bisect])
+
+        Share[rows] = Snew
+        active = np.abs(Snew - S) >= tol
+        rows, S, lo, hi = rows[active], Snew[active], lo[active], hi[active]
+
+    return Share, evals
+
+def solve_one_period(cFuncNext, ShockDstn, aGrid, ShareGrid, CRRA, Rfree,
+                     PermGroFac, DiscFacEff, ShareLimit=None, ShareGuess=None,
+                     width=2, share_method='grid'):
+    '''
+    Solves one period of the problem given next period's consumption function.
+
+    Parameters
+    ----------
+    cFuncNext : function
+        Next period's consumption function of normalized market resources.
+    ShockDstn : [np.array]
+        Probabilities, permanent shocks, transitory shocks and risky returns
+        that can be realized next period.
+    aGrid : np.array
+        Grid of normalized end-of-period assets.
+    ShareGrid : np.array
+        Grid of risky shares on which the first order condition is evaluated
+        (only used with share_method = 'grid').
+    CRRA : float
+        Coefficient of relative risk aversion.
+    Rfree : float
+        Risk free interest factor.
+    PermGroFac : float
+        Expected growth factor of permanent income.
+    DiscFacEff : float
+        Discount factor times the survival probability.
+    ShareLimit : float
+        Limit of the risky share as assets go to infinity, used to extrapolate.
+    ShareGuess : np.array
+        Guess for the optimal share at every point of aGrid. If given, the
+        grid search is done with find_share_warm instead of over the whole
+        grid, and the root finder starts from it.
+    width : int
+        Half width of the search windows of find_share_warm.
+    share_method : str
+        'grid' to find the share by interpolating the first order condition
+        over ShareGrid, as HARK does, or 'root' to solve for it with
+        find_share_root.
+
+    Returns
+    -------
+    solution : CGMSolution
+        This period's consumption and risky share functions. Its attribute
+        FOCevals holds the number of evaluations of the first order condition.
+    '''
+    ShkPrbs, PermShk, TranShk, Risky = ShockDstn
+
+    # Portfolio choice at every end-of-period asset level
+    if share_method == 'root':
+        Share, FOCevals = find_share_root(aGrid, ShockDstn, Rfree, PermGroFac,
+                                          CRRA, cFuncNext, ShareGuess)
+    elif ShareGuess is None:
+        FOC = calc_share_FOC(aGrid, ShareGrid, ShockDstn, Rfree, PermGroFac, CRRA, cFuncNext)
+        Share = find_share(FOC, ShareGrid)
+        FOCevals = FOC.size
+    else:
+        Share, FOCevals = find_share_warm(aGrid, ShareGrid, ShareGuess, ShockDstn,
+                                          Rfree, PermGroFac, CRRA, cFuncNext, width)
+
+    # End-of-period marginal value given the optimal share
+    Reff = Rfree + Share[:, np.newaxis]*(Risky - Rfree)
+    mNext = aGrid[:, np.newaxis]*Reff/(PermGroFac*PermShk) + TranShk
+    vPNext = marg_value(cFuncNext(mNext), CRRA)
+    EndOfPrdvP = DiscFacEff*PermGroFac**(-CRRA) * \
+                 np.dot(Reff*vPNext, ShkPrbs*PermShk**(-CRRA))
+
+    # Invert the Euler equation to get the endogenous grid
+    cGrid = EndOfPrdvP**(-1.0/CRRA)
+    mGrid = aGrid + cGrid
+
+    solution = CGMSolution(mGrid=np.insert(mGrid, 0, 0.0),
+                           cGrid=np.insert(cGrid, 0, 0.0),
+                           aGrid=np.insert(aGrid, 0, 0.0),
+                           ShareGrid=np.insert(Share, 0, 1.0),
+                           ShareLimit=ShareLimit)
+    solution.FOCevals = FOCevals
+
+    return solution
+
+def setup_cgm(params):
+    '''
+    Builds the inputs that the solvers need from a calibration dictionary.
+
+    Returns
+    -------
+    agent : PortfolioConsumerType
+        Unsolved agent created from the calibration. HARK's constructor builds
+        the income distributions and the asset grid.
+    aGrid : np.array
+        Grid of normalized end-of-period assets.
+    ShareGrid : np.array
+        Grid of RiskyShareCount risky shares between 0 and 1.
+    ShockDstns : [[np.array]]
+        Joint shock distribution of every period (see make_shock_dstns).
+    ShareLimit : float
+        Limit of the risky share as assets go to infinity.
+    '''
+    agent = cpm.PortfolioConsumerType(**params)
+
+    aGrid = np.asarray(agent.aXtraGrid)
+    ShareGrid = np.linspace(0.0, 1.0, agent.RiskyShareCount)
+    ShockDstns = make_shock_dstns(agent)
+    ShareLimit = agent.RiskyShareLimitFunc(agent.approxRiskyDstn(agent.RiskyCount))
+
+    return agent, aGrid, ShareGrid, ShockDstns, ShareLimit
+
+def solve_cgm(params, guess=None, width=2, share_method='grid'):
+    '''
+    Solves the life cycle problem described by a calibration dictionary such
+    as Calibration.params.dict_portfolio.
+
+    Parameters
+    ----------
+    params : dict
+        Dictionary of parameters that would be used to create a
+        PortfolioConsumerType.
+    guess : [CGMSolution]
+        Solution of a nearby calibration (e.g. the previous point of a sweep).
+        If given, its risky share functions seed the search for the optimal
+        share at every age (see find_share_warm).
+    width : int
+        Half width of the search windows used with a guess.
+    share_method : str
+        'grid' (the default, which replicates HARK) or 'root'. See
+        solve_one_period.
+
+    Returns
+    -------
+    solution : [CGMSolution]
+        A list with T_cycle + 1 elements, ordered by age. The last element is
+        the terminal period, in which the agent consumes everything.
+    '''
+    agent, aGrid, ShareGrid, ShockDstns, ShareLimit = setup_cgm(params)
+
+    # Terminal period: consume everything
+    solution = [CGMSolution(mGrid=np.array([0.0, 1.0]),
+                            cGrid=np.array([0.0, 1.0]),
+                            aGrid=np.array([0.0, 1.0]),
+                            ShareGrid=np.array([0.0, 0.0]))]
+
+    with np.errstate(divide='ignore', over='ignore', under='ignore', invalid='ignore'):
+        for t in reversed(range(agent.T_cycle)):
+            cFuncNext = solution[0].cFunc[0][0]
+            if guess is None:
+                ShareGuess = None
+            else:
+                ShareGuess = guess[t].RiskyShareFunc[0][0](aGrid)
+            solution.insert(0, solve_one_period(cFuncNext, ShockDstns[t], aGrid,
+                                                ShareGrid, agent.CRRA, agent.Rfree,
+                                                agent.PermGroFac[t],
+                                                agent.DiscFac*agent.LivPrb[t],
+                                                ShareLimit, ShareGuess, width,
+                                                share_method))
+
+    return solution
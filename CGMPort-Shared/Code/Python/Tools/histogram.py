@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic propagation of the distribution of agents over the life cycle.
+
+Instead of simulating agents, propagate_distribution follows the distribution
+of normalized market resources itself. The distribution at every age is a
+histogram over a fixed grid of mNrm. Each gridpoint is sent through the
+policy functions and the joint quadrature of permanent, transitory and return
+shocks, and its mass is split between the two gridpoints nearest to each
+resulting mNrm (the "lottery" method of Young, 2010). The transition at
+every age is a sparse matrix, so the whole life cycle takes a few sparse
+products and the resulting profiles have no sampling error.
+
+Levels are handled with a second histogram that carries the mass weighted by
+permanent income, which is updated with the permanent shock of every
+transition. It gives exact means of permanent income and of market resources
+and consumption in levels.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from HARK.utilities import makeGridExpMult
+
+from Tools.cohort import cohort_ages
+from Tools.egm import from_hark, make_shock_dstns
+
+# %% Transitions
+
+def lottery(mGrid, mNext, prob):
+    '''
+    Splits the probability of moving from every gridpoint to each value of
+    mNext between the two closest points of mGrid, so that the expected mNrm
+    is preserved. Values beyond the grid are assigned to its ends.
+
+    Parameters
+    ----------
+    mGrid : np.array
+        Grid on which the histogram is defined.
+    mNext : np.array
+        Array of shape (origins, shocks) with the mNrm that every origin
+        (usually every gridpoint) leads to after every shock.
+    prob : np.array
+        Array of the same shape with the corresponding probabilities (or
+        weights).
+
+    Returns
+    -------
+    trans : sparse.csr_matrix
+        Transition matrix with one row per origin and one column per
+        gridpoint.
+    '''
+    n = mGrid.size
+    mNext = np.clip(mNext, mGrid[0], mGrid[-1])
+    j = np.clip(np.searchsorted(mGrid, mNext, side='right'), 1, n - 1)
+    alpha = (mNext - mGrid[j-1])/(mGrid[j] - mGrid[j-1])
+
+    rows = np.broadcast_to(np.arange(mNext.shape[0])[:, np.newaxis], mNext.shape)
+    data = np.concatenate(((prob*(1.0 - alpha)).flatten(), (prob*alpha).flatten()))
+    cols = np.concatenate(((j - 1).flatten(), j.flatten()))
+    rows = np.concatenate((rows.flatten(), rows.flatten()))
+
+    return sparse.csr_matrix((data, (rows, cols)), shape=(mNext.shape[0], n))
+
+# %% Propagation
+
+class AgeDistributions(object):
+    '''
+    Distributions of agents over normalized market resources at every age.
+
+    Attributes
+    ----------
+    ages : np.array
+        Age (in years) of every row, labelled as in Tools.cohort (see
+        cohort_ages). Row t is the distribution at the moment of deciding
+        with solution[t].
+    weight : np.array
+        Probability of being alive at every age.
+    mGrid : np.array
+        Grid of normalized market resources.
+    pmf : np.array
+        (ages x gridpoints) array with the probability of every gridpoint.
+    pmass : np.array
+        (ages x gridpoints) array with the same probabilities multiplied by
+        the mean permanent income of the agents at every gridpoint.
+    values : dict
+        (ages x gridpoints) arrays with mNrmNow, cNrmNow, aNrmNow and
+        RiskyShareNow at every gridpoint.
+    '''
+
+    def __init__(self, ages, weight, mGrid, pmf, pmass, values):
+        self.ages = ages
+        self.weight = weight
+        self.mGrid = mGrid
+        self.pmf = pmf
+        self.pmass = pmass
+        self.values = values
+
+    def mean(self, var):
+        '''
+        Mean of a variable at every age, conditional on survival. Normalized
+        variables (mNrmNow, cNrmNow, aNrmNow, RiskyShareNow), permanent income
+        (pLvlNow) and levels (mLvlNow, cLvlNow, aLvlNow) are available.
+        '''
+        if var == 'pLvlNow':
+            return self.pmass.sum(axis=1)
+        if var in ['mLvlNow', 'cLvlNow', 'aLvlNow']:
+            nrm = var.replace('Lvl', 'Nrm')
+            return (self.pmass*self.values[nrm]).sum(axis=1)
+        return (self.pmf*self.values[var]).sum(axis=1)
+
+    def quantile(self, var, q):
+        '''
+        Quantile q of a normalized variable (mNrmNow, cNrmNow, aNrmNow or
+        RiskyShareNow) at every age.
+        '''
+        result = np.zeros(self.ages.size)
+        for t in range(self.ages.size):
+            order = np.argsort(self.values[var][t], kind='stable')
+            cdf = np.cumsum(self.pmf[t, order])
+            i = min(np.searchsorted(cdf, q*cdf[-1]), cdf.size - 1)
+            result[t] = self.values[var][t, order[i]]
+        return result
+
+def propagate_distribution(agent, mGrid=None):
+    '''
+    Computes the distribution of a cohort over normalized market resources at
+    every age, without simulation.
+
+    Parameters
+    ----------
+    agent : PortfolioConsumerType
+        A solved agent. Its shock quadrature (income shocks and RiskyCount
+        return nodes), growth factors, survival probabilities and initial
+        conditions are used. Newborns start with assets exp(aNrmInitMean).
+    mGrid : np.array
+        Grid of normalized market resources for the histograms. Defaults to
+        2000 points between 0 and 500, denser at low values.
+
+    Returns
+    -------
+    dist : AgeDistributions
+        The distribution at every age.
+    '''
+    if mGrid is None:
+        mGrid = makeGridExpMult(0.0, 500.0, 2000, 3)
+    mGrid = np.asarray(mGrid)
+
+    T = agent.T_cycle
+    solution = from_hark(agent.solution)
+    ShockDstns = make_shock_dstns(agent)
+
+    pmf = np.zeros((T, mGrid.size))
+    pmass = np.zeros((T, mGrid.size))
+    values = dict([(name, np.zeros((T, mGrid.size)))
+                   for name in ['mNrmNow', 'cNrmNow', 'aNrmNow', 'RiskyShareNow']])
+
+    # Newborns: initial assets earn the risk free rate and there is no
+    # transitory shock, as in HARK's simulation
+    IncProbs, PermShk, TranShk = agent.IncomeDstn[0]
+    PermShk = PermShk*agent.PermGroFac[0]
+    pLvlInit = np.exp(agent.pLvlInitMean + agent.pLvlInitStd**2/2)
+    mInit = (np.exp(agent.aNrmInitMean)*agent.Rfree/PermShk + 1.0)[np.newaxis, :]
+    pmf[0] = lottery(mGrid, mInit, IncProbs[np.newaxis, :]).toarray()[0]
+    pmass[0] = lottery(mGrid, mInit, (IncProbs*PermShk*pLvlInit)[np.newaxis, :]).toarray()[0]
+
+    for t in range(T):
+
+        # Policies at every gridpoint
+        cNrm = solution[t].cFunc[0][0](mGrid)
+        aNrm = mGrid - cNrm
+        Share = solution[t].RiskyShareFunc[0][0](aNrm)
+        for name, value in zip(['mNrmNow', 'cNrmNow', 'aNrmNow', 'RiskyShareNow'],
+                               [mGrid, cNrm, aNrm, Share]):
+            values[name][t] = value
+
+        if t == T - 1:
+            break
+
+        # Transition to the next age, with the shocks of period t
+        ShkPrbs, PermShk, TranShk, Risky = ShockDstns[t]
+        Growth = agent.PermGroFac[t]*PermShk
+        Reff = agent.Rfree + Share[:, np.newaxis]*(Risky - agent.Rfree)
+        mNext = aNrm[:, np.newaxis]*Reff/Growth + TranShk
+        prob = np.broadcast_to(ShkPrbs, mNext.shape)
+
+        pmf[t+1] = lottery(mGrid, mNext, prob).T.dot(pmf[t])
+        pmass[t+1] = lottery(mGrid, mNext, prob*Growth).T.dot(pmass[t])
+
+    weight = np.concatenate(([1.0], np.cumprod(agent.LivPrb[:T-1])))
+    ages = cohort_ages(T)
+
+    return AgeDistributions(ages, weight, mGrid, pmf, pmass, values)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming per-age statistics of simulated variables.
+
+Collecting a whole simulated panel in a data frame and grouping it by age
+needs memory proportional to the number of agents times the number of
+periods. An AgeMoments aggregator is instead fed the values of each period
+as they are simulated and keeps, for every age and variable, the (weighted)
+count, mean and sum of squared deviations, plus a compact quantile sketch.
+
+Aggregators built by different workers can be merged. Counts, means and
+variances merge exactly; quantiles are approximate, with a rank error of the
+order of 1/compression.
+"""
+
+import numpy as np
+
+# %% Quantile sketch
+
+def pool_centroids(values, weights, compression):
+    '''
+    Pools sorted, weighted points into (at most) compression centroids of
+    equal weight.
+    '''
+    total = weights.sum()
+    mid = np.cumsum(weights) - 0.5*weights
+    bins = np.minimum((mid/total*compression).astype(int), compression - 1)
+
+    pooled = np.bincount(bins, weights=weights, minlength=compression)
+    sums = np.bincount(bins, weights=weights*values, minlength=compression)
+    keep = pooled > 0
+    return sums[keep]/pooled[keep], pooled[keep]
+
+class QuantileSketch(object):
+    '''
+    A mergeable summary of a distribution: a sorted list of at most
+    2*compression weighted centroids. Whenever it grows beyond that, adjacent
+    centroids are pooled into compression bins of equal weight. The exact
+    minimum and maximum are kept separately.
+    '''
+
+    def __init__(self, compression=1000):
+        self.compression = compression
+        self.values = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values, weights=None):
+        '''
+        Adds observations (with optional weights) to the sketch.
+        '''
+        values = np.asarray(values, dtype=float).reshape(-1)
+        if weights is None:
+            values = np.sort(values)
+            weights = np.ones(values.size)
+        else:
+            weights = np.asarray(weights, dtype=float).reshape(-1)
+            values, weights = values[weights > 0], weights[weights > 0]
+            order = np.argsort(values)
+            values, weights = values[order], weights[order]
+        if values.size == 0:
+            return
+
+        self.min = min(self.min, values[0])
+        self.max = max(self.max, values[-1])
+
+        # Summarize large batches on their own before merging them in
+        if values.size > 2*self.compression:
+            values, weights = pool_centroids(values, weights, self.compression)
+
+        values = np.concatenate((self.values, values))
+        weights = np.concatenate((self.weights, weights))
+        order = np.argsort(values, kind='stable')
+        self.values, self.weights = values[order], weights[order]
+
+        if self.values.size > 2*self.compression:
+            self.values, self.weights = pool_centroids(self.values, self.weights,
+                                                       self.compression)
+
+    def merge(self, other):
+        '''
+        Adds the contents of another sketch to this one.
+        '''
+        if other.values.size > 0:
+            self.add(other.values, other.weights)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        '''
+        Approximate quantile(s) q of the distribution.
+        '''
+        if self.values.size == 0:
+            return np.full(np.shape(q), np.nan)
+        cum = np.cumsum(self.weights)
+        mid = cum - 0.5*self.weights
+        return np.interp(np.asarray(q)*cum[-1],
+                         np.concatenate(([0.0], mid, [cum[-1]])),
+                         np.concatenate(([self.min], self.values, [self.max])))
+
+# %% Per-age statistics
+
+class AgeMoments(object):
+    '''
+    Streaming counts, means, variances and quantiles of several variables at
+    every age.
+
+    Parameters
+    ----------
+    ages : [int]
+        Ages that will be tracked.
+    variables : [str]
+        Names of the variables that will be tracked.
+    compression : int
+        Size of the quantile sketches. Larger values give more precise
+        quantiles.
+    '''
+
+    def __init__(self, ages, variables, compression=1000):
+        self.ages = np.asarray(ages, dtype=int)
+        self.variables = list(variables)
+        self.compression = compression
+
+        n = self.ages.size
+        self.count = np.zeros(n)
+        self.means = dict([(var, np.zeros(n)) for var in self.variables])
+        self.M2 = dict([(var, np.zeros(n)) for var in self.variables])
+        self.sketches = dict([(var, [QuantileSketch(compression) for i in range(n)])
+                              for var in self.variables])
+
+    def _combine(self, row, var, count, mean, M2):
+        '''
+        Combines the moments of a group of observations with those stored for
+        an age (Chan et al.'s parallel update).
+        '''
+        total = self.count[row] + count
+        delta = mean - self.means[var][row]
+        self.means[var][row] += delta*count/total
+        self.M2[var][row] += M2 + delta**2*self.count[row]*count/total
+
+    def update(self, age, values, weights=None):
+        '''
+        Adds observations to the aggregator.
+
+        Parameters
+        ----------
+        age : int or np.array
+            Age of the observations: a single age or one per observation.
+        values : dict
+            Arrays of observations, by variable name. Variables that are not
+            tracked are ignored.
+        weights : np.array
+            Optional weight of every observation (e.g. survival probabilities
+            or an alive mask).
+        '''
+        n = np.asarray(values[self.variables[0]]).size
+        age = np.broadcast_to(np.asarray(age, dtype=int), (n,))
+        if weights is not None:
+            weights = np.broadcast_to(np.asarray(weights, dtype=float), (n,))
+
+        for a in np.unique(age):
+            rows = np.searchsorted(self.ages, a)
+            if rows >= self.ages.size or self.ages[rows] != a:
+                raise ValueError('Age ' + str(a) + ' is not tracked.')
+            these = age == a
+            if np.all(these):
+                these = slice(None)
+
+            if weights is None:
+                w = None
+                count = float(np.asarray(age[these]).size)
+            else:
+                w = weights[these]
+                count = w.sum()
+            if count == 0:
+                continue
+
+            for var in self.variables:
+                x = np.asarray(values[var]).reshape(-1)[these]
+                if w is None:
+                    mean = x.mean()
+                    M2 = np.dot(x - mean, x - mean)
+                else:
+                    mean = np.dot(w, x)/count
+                    M2 = np.dot(w, (x - mean)**2)
+                self._combine(rows, var, count, mean, M2)
+                self.sketches[var][rows].add(x, w)
+
+            self.count[rows] += count
+
+    def merge(self, other):
+        '''
+        Adds the statistics of another aggregator over the same ages and
+        variables (e.g. one built by a parallel worker) to this one.
+        '''
+        for row in range(self.ages.size):
+            if other.count[row] == 0:
+                continue
+            for var in self.variables:
+                self._combine(row, var, other.count[row], other.means[var][row],
+                              other.M2[var][row])
+                self.sketches[var][row].merge(other.sketches[var][row])
+            self.count[row] += other.count[row]
+
+        return self
+
+    def mean(self, var):
+        '''
+        Mean of a variable at every age.
+        '''
+        with np.errstate(invalid='ignore'):
+            return np.where(self.count > 0, self.means[var], np.nan)
+
+    def var(self, var):
+        '''
+        Variance of a variable at every age.
+        '''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.M2[var]/self.count
+
+    def std(self, var):
+        '''
+        Standard deviation of a variable at every age.
+        '''
+        return np.sqrt(self.var(var))
+
+    def quantile(self, var, q):
+        '''
+        Approximate quantile q of a variable at every age.
+        '''
+        return np.array([sketch.quantile(q) for sketch in self.sketches[var]])
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk panels of simulated agents, partitioned by age.
+
+write_panel stores the histories of a simulated cohort (a
+Tools.cohort.CohortHistory or a Tools.history.HistoryRecorder) in a folder
+with one partition per age, age=<age>/, holding one file with a column per
+variable. Files are written in the Parquet format when pyarrow is installed
+and as uncompressed .npz archives otherwise; both formats can read a single
+column without loading the rest. read_panel and iter_panel read back only the
+requested columns and ages, so profiles, percentile bands and plots can be
+recomputed without simulating again.
+
+Every row is one agent at one age, with the columns Agent (the agent's
+index in the cohort) and Age besides the simulated variables. When survival
+was simulated with an alive mask, only the agents that are alive are stored.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# %% Writing
+
+def _histories(source):
+    '''
+    Returns the histories of a CohortHistory or HistoryRecorder as a dict of
+    (ages x agents) arrays, by variable name.
+    '''
+    if hasattr(source, 'hist'):
+        return dict(source.hist)
+    return dict([(name[:-5], value) for name, value in vars(source).items()
+                 if name.endswith('_hist')])
+
+def write_panel(source, path, fmt=None, meta=None):
+    '''
+    Writes the histories of a simulated cohort to a panel partitioned by age.
+
+    Parameters
+    ----------
+    source : CohortHistory or HistoryRecorder
+        The simulated histories.
+    path : str
+        Folder of the panel. It is created if needed.
+    fmt : str
+        'parquet' or 'npz'. Defaults to 'parquet' when pyarrow is installed.
+    meta : dict
+        Additional information stored with the panel (for instance the
+        calibration and seed it comes from), returned by read_meta.
+    '''
+    if fmt is None:
+        fmt = 'npz' if pa is None else 'parquet'
+    if fmt == 'parquet' and pa is None:
+        raise ImportError('Writing Parquet files requires pyarrow.')
+    elif fmt not in ['parquet', 'npz']:
+        raise ValueError("fmt must be 'parquet' or 'npz'.")
+
+    hist = _histories(source)
+    alive = hist.pop('alive', getattr(source, 'alive', None))
+    ages = np.asarray(source.ages)
+    N = next(iter(hist.values())).shape[1]
+    agent_id = np.arange(N, dtype=np.int32)
+
+    os.makedirs(path, exist_ok=True)
+    for row, age in enumerate(ages):
+
+        keep = slice(None) if alive is None else np.asarray(alive[row])
+        columns = {'Agent': agent_id[keep],
+                   'Age': np.full(agent_id[keep].size, age, dtype=np.int16)}
+        for name, values in hist.items():
+            if name != 't_age':
+                columns[name] = np.asarray(values[row])[keep]
+
+        folder = os.path.join(path, 'age=%i' % age)
+        os.makedirs(folder, exist_ok=True)
+        if fmt == 'parquet':
+            pq.write_table(pa.table(columns), os.path.join(folder, 'part.parquet'))
+        else:
+            np.savez(os.path.join(folder, 'part.npz'), **columns)
+
+    info = {'format': fmt, 'ages': ages.tolist(), 'N': N,
+            'columns': ['Agent', 'Age'] + [name for name in hist if name != 't_age'],
+            'meta': meta if meta is not None else {}}
+    if getattr(source, 'weight', None) is not None:
+        info['weight'] = np.asarray(source.weight).tolist()
+    with open(os.path.join(path, 'panel.json'), 'w') as f:
+        json.dump(info, f)
+
+# %% Reading
+
+def read_meta(path):
+    '''
+    Returns the description of a stored panel (format, ages, number of
+    agents, columns, survival weights and user supplied meta), or None if
+    there is no panel in the folder.
+    '''
+    fname = os.path.join(path, 'panel.json')
+    if not os.path.exists(fname):
+        return None
+    with open(fname) as f:
+        return json.load(f)
+
+def iter_panel(path, columns=None, ages=None):
+    '''
+    Reads a panel one age at a time.
+
+    Parameters
+    ----------
+    path : str
+        Folder of the panel.
+    columns : [str]
+        Columns to read. All by default.
+    ages : [int]
+        Ages to read. All by default.
+
+    Yields
+    ------
+    age : int
+        Age of the partition.
+    data : dict
+        Arrays with the requested columns of the agents of that age.
+    '''
+    info = read_meta(path)
+    if info is None:
+        raise ValueError('There is no panel in ' + path)
+    if columns is None:
+        columns = info['columns']
+
+    for age in info['ages']:
+        if ages is not None and age not in ages:
+            continue
+        folder = os.path.join(path, 'age=%i' % age)
+        if info['format'] == 'parquet':
+            table = pq.read_table(os.path.join(folder, 'part.parquet'),
+                                  columns=columns)
+            data = dict([(name, table.column(name).to_numpy()) for name in columns])
+        else:
+            with np.load(os.path.join(folder, 'part.npz')) as archive:
+                data = dict([(name, archive[name]) for name in columns])
+        yield age, data
+
+def read_panel(path, columns=None, ages=None):
+    '''
+    Reads the requested columns and ages of a panel into a data frame with one
+    row per agent and age.
+    '''
+    parts = [pd.DataFrame(data) for age, data in iter_panel(path, columns, ages)]
+    return pd.concat(parts, ignore_index=True)
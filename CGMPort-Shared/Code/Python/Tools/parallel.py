@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel simulation of large cohorts.
+
+simulate_parallel splits a cohort into chunks of agents and simulates every
+chunk with Tools.cohort.simulate_cohort in a pool of processes. Each chunk
+gets its own random number stream, spawned from a master seed with
+np.random.SeedSequence, so the streams are statistically independent and the
+results only depend on the master seed and the number of chunks: not on the
+number of processes, nor on the order in which the workers finish. With
+common_returns = True, the return history is drawn once from the master seed
+and shared by every chunk, so it does not depend on the number of chunks
+either. The per-age statistics (Tools.moments.AgeMoments) or histories of the chunks are
+combined in chunk order.
+
+A solved PortfolioConsumerType cannot be sent to other processes because its
+calibration contains lambdas, so the workers receive a CohortInputs object
+with only what the simulation needs. The policy functions are not pickled:
+they are published once in shared memory (Tools.shared) and every worker
+attaches to the same copy.
+"""
+
+import multiprocessing
+from copy import copy
+
+import numpy as np
+
+from Tools.cohort import CohortHistory, agent_risky_draws, cohort_ages, \
+                         simulate_cohort
+from Tools.egm import from_hark
+from Tools.moments import AgeMoments
+from Tools.shared import attach_solution, publish_solution
+
+# %% Picklable inputs
+
+class CohortInputs(object):
+    '''
+    The parts of a solved agent that Tools.cohort.simulate_cohort uses: the
+    policy functions (as CGMSolutions), income distributions, growth factors,
+    survival probabilities, initial conditions and return draws (see
+    Tools.cohort.agent_risky_draws). Unlike the agent, it can be pickled.
+    '''
+
+    def __init__(self, agent):
+        self.T_cycle = agent.T_cycle
+        self.solution = from_hark(agent.solution[:agent.T_cycle])
+        self.IncomeDstn = [[np.asarray(x) for x in dstn]
+                           for dstn in agent.IncomeDstn[:agent.T_cycle]]
+        self.PermGroFac = list(agent.PermGroFac)
+        self.LivPrb = list(agent.LivPrb)
+        self.Rfree = agent.Rfree
+        self.RiskyDraw = agent_risky_draws(agent)
+        self.aNrmInitMean = agent.aNrmInitMean
+        self.aNrmInitStd = agent.aNrmInitStd
+        self.pLvlInitMean = agent.pLvlInitMean
+        self.pLvlInitStd = agent.pLvlInitStd
+
+def split_agents(N, chunks):
+    '''
+    Splits N agents into the given number of chunks, as evenly as possible.
+    '''
+    return [len(x) for x in np.array_split(np.arange(N), chunks)]
+
+# %% Workers
+
+# Inputs of the simulation, set once in every worker process
+_inputs = None
+
+def _init_worker(inputs, handle=None):
+    global _inputs
+    _inputs = inputs
+    if handle is not None:
+        # Attach to the published policies instead of receiving a copy
+        _inputs.solution = attach_solution(handle)
+
+def _simulate_chunk(task):
+    '''
+    Simulates one chunk of the cohort. Runs in a worker process.
+    '''
+    N, seed, kwargs, stats = task
+
+    aggregator = None
+    if stats is not None:
+        aggregator = AgeMoments(*stats)
+
+    history = simulate_cohort(_inputs, N, seed = seed, aggregator = aggregator,
+                              **kwargs)
+
+    return history, aggregator
+
+# %% Driver
+
+def simulate_parallel(agent, N, seed=0, chunks=None, processes=None,
+                      variables=None, compression=1000, **kwargs):
+    '''
+    Simulates a cohort of N agents in parallel.
+
+    Parameters
+    ----------
+    agent : PortfolioConsumerType or CohortInputs
+        A solved agent.
+    N : int
+        Number of agents in the cohort.
+    seed : int
+        Master seed. Chunk i is simulated with the i-th stream spawned from
+        np.random.SeedSequence(seed). With common_returns = True, the common
+        return history is drawn from the master seed itself.
+    chunks : int
+        Number of chunks in which the cohort is split. Results are reproducible
+        for a given seed and number of chunks. Defaults to the number of
+        processes.
+    processes : int
+        Number of worker processes. Defaults to the number of cores. With
+        processes = 1 everything runs in the current process.
+    variables : [str]
+        If given, the variables whose statistics are collected at every age
+        with a Tools.moments.AgeMoments aggregator.
+    compression : int
+        Size of the quantile sketches of the aggregator.
+    **kwargs
+        Other arguments of Tools.cohort.simulate_cohort, such as survival,
+        RiskyDraw (which must be picklable, e.g. a NormalDraws), common_returns
+        or track_vars.
+
+    Returns
+    -------
+    history : CohortHistory
+        The simulated histories of all chunks, with agents in chunk order.
+    stats : AgeMoments
+        The merged statistics of all chunks, or None if no variables were
+        requested.
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if chunks is None:
+        chunks = processes
+
+    inputs = agent if isinstance(agent, CohortInputs) else CohortInputs(agent)
+
+    stats = None
+    if variables is not None:
+        kwargs.setdefault('track_vars', [])
+        ages = cohort_ages(inputs.T_cycle)
+        stats = (ages, variables, compression)
+
+    master = np.random.SeedSequence(seed)
+    if kwargs.get('common_returns', False) and kwargs.get('shocks') is None:
+        # One return history for all chunks, drawn with the master seed
+        # (the chunks use its children)
+        kwargs.setdefault('risky_common',
+                          np.random.default_rng(master).random(inputs.T_cycle))
+
+    seeds = master.spawn(chunks)
+    tasks = [(n, s, kwargs, stats) for n, s in zip(split_agents(N, chunks), seeds)]
+
+    if processes == 1:
+        _init_worker(inputs)
+        results = list(map(_simulate_chunk, tasks))
+    else:
+        with publish_solution(inputs.solution) as shared:
+            shipped = copy(inputs)
+            shipped.solution = None
+            with multiprocessing.Pool(processes, initializer = _init_worker,
+                                      initargs = (shipped, shared.handle)) as pool:
+                results = pool.map(_simulate_chunk, tasks)
+
+    # Combine the chunks in order
+    histories = [r[0] for r in results]
+    first = histories[0]
+    hist = dict([(name[:-5], np.hstack([getattr(h, name) for h in histories]))
+                 for name in vars(first) if name.endswith('_hist')])
+    alive = None
+    if first.alive is not None:
+        alive = np.hstack([h.alive for h in histories])
+    # Independent units of different chunks are numbered consecutively
+    offsets = np.cumsum([0] + [h.units.max() + 1 if h.units.size else 0
+                               for h in histories[:-1]])
+    units = np.concatenate([h.units + o for h, o in zip(histories, offsets)])
+    history = CohortHistory(first.ages, first.weight, alive, hist, units)
+
+    aggregator = None
+    if stats is not None:
+        aggregator = AgeMoments(*stats)
+        for r in results:
+            aggregator.merge(r[1])
+
+    return history, aggregator
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+A cached runner for the stages of do_ALL.py.
+
+do_ALL.py used to import the simulation, comparison and appendix scripts one
+after the other, for their side effects. Here every script is a Stage that
+declares the inputs it uses:
+
+- 'calibration': the calibration in Calibration/params.py,
+- 'solution': the solution of the base calibration (Tools.cache),
+- 'simulation': the parameters and random number generator of simulations,
+- 'fortran': the tables produced by CGM's Fortran code (Tools.fortran),
+
+and the figures and results it produces. run_stages first prepares the inputs
+that are shared by several stages (solving the base calibration and
+converting the Fortran tables once, in this process), and then runs the
+stages, which are independent of each other, in parallel processes.
+
+After a stage has run, the fingerprints of its inputs, the hashes of the
+files of every module of this folder that it imported and the figure formats
+are stored in Cache/Stages/<name>.json. On later runs a stage is skipped, and
+its earlier figures and results are kept, if none of them has changed and its
+outputs still exist.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+import traceback
+
+import numpy as np
+
+import HARK
+import Tools.figures
+from Tools.cache import CachePath, calibration_hash, sim_params, _hash_value
+
+# Code/Python, against which the scripts and outputs of stages are given
+CodePath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Folder in which the records of finished stages are stored
+StagePath = os.path.join(CachePath, 'Stages')
+
+# Bump this whenever the layout of the records changes
+stage_version = 1
+
+# %% Inputs
+
+def _calibration_fingerprint():
+    with open(os.path.join(CodePath, 'Calibration', 'params.py'), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _solution_fingerprint():
+    from Calibration.params import dict_portfolio
+    return calibration_hash(dict_portfolio)
+
+def _simulation_fingerprint():
+    # Functions among the parameters (the risky return draws) are covered by
+    # the calibration's fingerprint
+    from Calibration.params import dict_portfolio
+    h = hashlib.sha1()
+    h.update(('numpy ' + np.__version__).encode())
+    for key in sim_params:
+        if key in dict_portfolio and not callable(dict_portfolio[key]):
+            h.update(key.encode())
+            _hash_value(h, dict_portfolio[key])
+    return h.hexdigest()
+
+def _fortran_fingerprint():
+    from Tools.fortran import file_stamp, year_file
+    stamp = file_stamp([year_file(y) for y in range(1, 81)])
+    return hashlib.sha1(json.dumps(stamp, sort_keys=True).encode()).hexdigest()
+
+def _prepare_solution():
+    from Calibration.params import dict_portfolio
+    from Tools.cache import solve_cached
+    solve_cached(dict_portfolio)
+
+def _prepare_fortran():
+    from Tools.fortran import load_fortran_years
+    load_fortran_years()
+
+# Name of every input -> (function returning its fingerprint, function that
+# prepares it before the stages that use it run, or None)
+inputs = {'calibration': (_calibration_fingerprint, None),
+          'solution': (_solution_fingerprint, _prepare_solution),
+          'simulation': (_simulation_fingerprint, None),
+          'fortran': (_fortran_fingerprint, _prepare_fortran)}
+
+# %% Stages
+
+class Stage(object):
+    '''
+    A script of do_ALL.py.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, which names its record.
+    script : str
+        Path of the script, relative to Code/Python.
+    message : str
+        Message printed when the stage starts.
+    inputs : [str]
+        Names of the inputs that the script uses (keys of Tools.pipeline.inputs).
+    figures : [str]
+        Names of the figures that the script saves in Figures/.
+    results : [str]
+        Other files that the script writes, relative to Code/Python.
+    '''
+
+    def __init__(self, name, script, message='', inputs=[], figures=[], results=[]):
+        self.name = name
+        self.script = script
+        self.message = message
+        self.inputs = inputs
+        self.figures = figures
+        self.results = results
+
+    def outputs(self):
+        '''
+        Paths of the files that the stage writes, given the requested figure
+        formats.
+        '''
+        return [os.path.join(CodePath, 'Figures', name + '.' + fmt)
+                for name in self.figures for fmt in Tools.figures.formats] + \
+               [os.path.join(CodePath, f) for f in self.results]
+
+    def record_file(self):
+        return os.path.join(StagePath, self.name + '.json')
+
+def _file_hash(fname):
+    if not os.path.exists(fname):
+        return None
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _code_hashes(modules):
+    '''
+    Hashes of the source files of the given modules (paths relative to
+    Code/Python).
+    '''
+    return dict([(m, _file_hash(os.path.join(CodePath, m))) for m in modules])
+
+def _stamp(stage, fingerprints, code):
+    return {'version': stage_version,
+            'HARK': HARK.__version__,
+            'inputs': dict([(name, fingerprints[name]) for name in stage.inputs]),
+            'code': code,
+            'formats': sorted(Tools.figures.formats)}
+
+def is_current(stage, fingerprints):
+    '''
+    Checks whether a stage can be skipped: it has a record, its inputs and
+    code match the record and all its outputs exist.
+    '''
+    if not os.path.exists(stage.record_file()):
+        return False
+    with open(stage.record_file()) as f:
+        record = json.load(f)
+    stamp = _stamp(stage, fingerprints, _code_hashes(record['stamp']['code']))
+    if record['stamp'] != stamp:
+        return False
+    return all(os.path.exists(fname) for fname in stage.outputs())
+
+def _local_modules():
+    '''
+    Names and source files (relative to Code/Python) of the imported modules
+    that belong to this folder.
+    '''
+    local = {}
+    for name, module in list(sys.modules.items()):
+        fname = getattr(module, '__file__', None)
+        if name in ['__main__', '__mp_main__'] or fname is None:
+            continue
+        fname = os.path.abspath(fname)
+        if fname.startswith(CodePath + os.sep) and fname.endswith('.py'):
+            local[name] = os.path.relpath(fname, CodePath).replace(os.sep, '/')
+    return local
+
+def _run_stage(stage):
+    '''
+    Runs the script of a stage in a fresh worker process and returns the
+    source files of Code/Python that it used, or the traceback of the error
+    it raised.
+    '''
+    try:
+        if CodePath not in sys.path:
+            sys.path.append(CodePath)
+
+        # Workers are forked from the main process, so forget the modules of
+        # this folder that it imported: those imported afterwards are the
+        # ones the stage uses
+        for name in _local_modules():
+            del sys.modules[name]
+
+        # Stages already run in parallel, so figures are written here
+        import Tools.figures
+        Tools.figures.workers = 0
+        runpy.run_path(os.path.join(CodePath, stage.script), run_name='__main__')
+        Tools.figures.wait_figures()
+
+        modules = set(_local_modules().values())
+        modules.add(stage.script.replace(os.sep, '/'))
+        return stage.name, sorted(modules), None
+    except Exception:
+        return stage.name, None, traceback.format_exc()
+
+# %% Running
+
+def run_stages(stages, processes=None, force=False):
+    '''
+    Runs the stages that are not current, in parallel.
+
+    Parameters
+    ----------
+    stages : [Stage]
+        The stages, in the order in which their messages are printed.
+    processes : int
+        Number of worker processes. Defaults to the number of CPUs.
+    force : bool
+        Run every stage, even if it is current.
+
+    Returns
+    -------
+    ran : [str]
+        Names of the stages that were run (the others were skipped).
+    '''
+    fingerprints = dict([(name, fingerprint()) for name, (fingerprint, prepare)
+                         in inputs.items()])
+
+    todo = []
+    for stage in stages:
+        if not force and is_current(stage, fingerprints):
+            print(stage.message + ' (unchanged, skipped)')
+        else:
+            todo.append(stage)
+    if len(todo) == 0:
+        return []
+
+    # Prepare the shared inputs once, before the stages compete for them
+    for name in inputs:
+        prepare = inputs[name][1]
+        if prepare is not None and any(name in stage.inputs for stage in todo):
+            prepare()
+
+    # Each stage runs in a fresh process, since the scripts keep state
+    # (figures, imported modules) at module level
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(todo))
+
+    failed = []
+    start = time.time()
+    pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+    try:
+        for stage in todo:
+            print(stage.message)
+        by_name = dict([(stage.name, stage) for stage in todo])
+        for name, modules, error in pool.imap_unordered(_run_stage, todo):
+            stage = by_name[name]
+            if error is not None:
+                print('Stage ' + name + ' failed:\n' + error)
+                failed.append(name)
+                continue
+
+            os.makedirs(StagePath, exist_ok=True)
+            record = {'stamp': _stamp(stage, fingerprints, _code_hashes(modules)),
+                      'outputs': [os.path.relpath(f, CodePath) for f in stage.outputs()]}
+            with open(stage.record_file(), 'w') as f:
+                json.dump(record, f, indent=1)
+            print('Stage %s finished (%.1f s)' % (name, time.time() - start))
+    finally:
+        pool.close()
+        pool.join()
+
+    if len(failed) > 0:
+        raise RuntimeError('The following stages failed: ' + ', '.join(failed))
+
+    return [stage.name for stage in todo]
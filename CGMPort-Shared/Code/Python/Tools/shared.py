@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Sharing solved policies with worker processes without copying them.
+
+Pools of workers (Tools.parallel and sweeps over parameters) used to receive
+a pickled copy of the solution, so every worker paid for serializing,
+sending and unpickling all the grids, and held its own copy of them.
+publish_solution instead stores the policies once, as the arrays of a
+Tools.compact.CompactSolution laid out back to back in a single block of
+shared memory (multiprocessing.shared_memory), or, where that is not
+available or a path is given, in a folder of memory-mapped .npy files. It
+returns a SharedSolution whose handle is a small picklable object with the
+name of the block and the layout of the arrays. Workers receive the handle
+and call attach_solution, which maps the arrays without copying them, so N
+workers share one copy and their startup does not depend on the size of the
+grids.
+
+The process that publishes a solution owns it and must release it with
+SharedSolution.close (or use the SharedSolution as a context manager) once
+the workers are done.
+"""
+
+import shutil
+import tempfile
+
+import numpy as np
+
+from Tools.compact import CompactSolution, compact_arrays, compact_solution, \
+                          load_compact_solution
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8, use memory-mapped files
+    shared_memory = None
+
+# %% Handles
+
+class SolutionHandle(object):
+    '''
+    What a worker needs to attach to a published solution: the name of the
+    shared memory block and the dtype, shape and offset of every array in it,
+    or the folder with the memory-mapped arrays.
+    '''
+
+    def __init__(self, name=None, layout=None, path=None):
+        self.name = name
+        self.layout = layout
+        self.path = path
+
+class SharedSolution(object):
+    '''
+    A solution published by publish_solution. Attributes are the handle to
+    send to the workers and the published CompactSolution itself.
+    '''
+
+    def __init__(self, handle, solution, shm=None, owned_path=None):
+        self.handle = handle
+        self.solution = solution
+        self._shm = shm
+        self._owned_path = owned_path
+
+    def close(self):
+        '''
+        Releases the shared memory block (or the temporary folder) that holds
+        the solution. Workers must not use it afterwards.
+        '''
+        self.solution = None
+        if self._shm is not None:
+            self._shm.unlink()
+            try:
+                self._shm.close()
+            except BufferError:
+                # Views of the arrays are still referenced in this process;
+                # the memory is freed when they are
+                pass
+            self._shm = None
+        if self._owned_path is not None:
+            shutil.rmtree(self._owned_path, ignore_errors=True)
+            self._owned_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# %% Publishing and attaching
+
+def _views(buf, layout):
+    '''
+    Arrays of a CompactSolution laid out in a buffer.
+    '''
+    return CompactSolution(**dict([(name, np.ndarray(shape, dtype=np.dtype(dtype),
+                                                      buffer=buf, offset=offset))
+                                   for name, dtype, shape, offset in layout]))
+
+def publish_solution(solution, dtype=np.float64, path=None):
+    '''
+    Stores the policies of a solution once, so that worker processes can
+    attach to them without copies.
+
+    Parameters
+    ----------
+    solution : list
+        The solution of a PortfolioConsumerType, of Tools.egm.solve_cgm or a
+        CompactSolution.
+    dtype : np.dtype
+        Precision of the stored gridpoints (see Tools.compact.compact_solution).
+    path : str
+        If given, the arrays are stored as memory-mapped files in this
+        folder instead of in shared memory.
+
+    Returns
+    -------
+    shared : SharedSolution
+        The published solution, with the handle for the workers.
+    '''
+    if not isinstance(solution, CompactSolution) or solution.dtype != dtype:
+        solution = compact_solution(solution, dtype=dtype)
+
+    if shared_memory is None or path is not None:
+        owned_path = None
+        if path is None:
+            path = owned_path = tempfile.mkdtemp(prefix='solution_')
+        solution.save(path)
+        return SharedSolution(SolutionHandle(path=path),
+                              load_compact_solution(path), owned_path=owned_path)
+
+    # Lay the arrays out back to back, each aligned to 64 bytes
+    layout = []
+    size = 0
+    for name in compact_arrays:
+        array = getattr(solution, name)
+        layout.append((name, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes//64)*64
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    published = _views(shm.buf, layout)
+    for name in compact_arrays:
+        getattr(published, name)[...] = getattr(solution, name)
+    published._shm = shm
+
+    return SharedSolution(SolutionHandle(name=shm.name, layout=layout),
+                          published, shm=shm)
+
+def attach_solution(handle):
+    '''
+    Returns the CompactSolution published under a handle, with arrays that
+    are views of the shared memory block (or memory-mapped files). The
+    solution keeps the block open for as long as it is referenced.
+    '''
+    if handle.path is not None:
+        return load_compact_solution(handle.path)
+
+    # Workers started by multiprocessing share the resource tracker of the
+    # process that published the solution, so attaching does not make them
+    # responsible for the block
+    try:
+        shm = shared_memory.SharedMemory(name=handle.name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=handle.name)
+
+    solution = _views(shm.buf, handle.layout)
+    solution._shm = shm
+    return solution
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Infinite horizon version of the CGM problem.
+
+The appendix compares the model's limiting behaviour with closed form
+results (the Merton-Samuelson share and the limiting MPC), which hold for an
+infinitely lived agent. solve_stationary takes the calibration of a single
+age, holds it fixed forever and iterates the one-period solver of Tools.egm
+to its fixed point. The iterations can optionally be accelerated with
+Anderson mixing or Aitken's delta-squared extrapolation, and the distance
+between successive iterates is recorded for inspection.
+"""
+
+import time
+
+import numpy as np
+
+from Tools.egm import setup_cgm, solve_one_period, ConsumptionPolicy
+
+# %% Acceleration
+
+def valid_cons(aGrid, cGrid):
+    '''
+    Checks that an (accelerated) iterate defines a proper consumption function:
+    positive consumption and an increasing endogenous grid.
+    '''
+    return np.all(cGrid > 0.0) and np.all(np.diff(aGrid + cGrid) > 0.0)
+
+def anderson_step(x_hist, g_hist):
+    '''
+    Anderson mixing: combines the last iterates x and their images g = T(x)
+    so that the combination of the residuals g - x has minimal norm.
+
+    Parameters
+    ----------
+    x_hist, g_hist : [np.array]
+        Iterates and their images, oldest first.
+
+    Returns
+    -------
+    x : np.array
+        Next iterate.
+    '''
+    F = np.array(g_hist) - np.array(x_hist)
+    G = np.array(g_hist)
+    if F.shape[0] == 1:
+        return G[-1]
+
+    dF = np.diff(F, axis=0).T
+    dG = np.diff(G, axis=0).T
+    gamma = np.linalg.lstsq(dF, F[-1], rcond=None)[0]
+    return G[-1] - dG.dot(gamma)
+
+def aitken_step(x0, x1, x2):
+    '''
+    Aitken's delta-squared extrapolation of three successive iterates, in its
+    vector form: the step from x1 to x2 is scaled by the factor that the
+    sequence would need to converge if the iteration were linear with a
+    single dominant eigenvalue.
+    '''
+    d1 = x2 - x1
+    d2 = d1 - (x1 - x0)
+    denom = np.dot(d2, d2)
+    if denom == 0.0:
+        return x2
+    return x2 - np.dot(d1, d2)/denom*d1
+
+# %% Solver
+
+def solve_stationary(params, t=None, tol=1e-8, maxiter=5000, accel=None,
+                     memory=5, share_method='grid'):
+    '''
+    Solves the infinite horizon problem in which the parameters of one period
+    of a life cycle calibration are repeated forever.
+
+    Parameters
+    ----------
+    params : dict
+        Calibration dictionary, such as Calibration.params.dict_portfolio.
+    t : int
+        Period (age index) whose discount factor, survival probability,
+        income growth and shocks are used. Defaults to the last period of
+        life which, in the CGM calibration, is a retiree without income risk.
+    tol : float
+        Convergence tolerance on the largest change in consumption between
+        successive iterates, at the points of the asset grid.
+    maxiter : int
+        Maximum number of iterations.
+    accel : str
+        None for plain fixed point iteration, 'anderson' for Anderson mixing
+        or 'aitken' for Aitken's delta-squared extrapolation.
+    memory : int
+        Number of past iterates used by Anderson mixing.
+    share_method : str
+        How to find the optimal share, 'grid' or 'root' (see
+        Tools.egm.solve_one_period).
+
+    Returns
+    -------
+    solution : CGMSolution
+        The stationary consumption and risky share functions, with additional
+        attributes: converged, iterations, distances (the change in
+        consumption at every iteration) and solve_time.
+    '''
+    agent, aGrid, ShareGrid, ShockDstns, ShareLimit = setup_cgm(params)
+    if t is None:
+        t = agent.T_cycle - 1
+
+    def update(cFuncNext):
+        return solve_one_period(cFuncNext, ShockDstns[t], aGrid, ShareGrid,
+                                agent.CRRA, agent.Rfree, agent.PermGroFac[t],
+                                agent.DiscFac*agent.LivPrb[t], ShareLimit,
+                                share_method = share_method)
+
+    def policy(cGrid):
+        return ConsumptionPolicy(np.insert(aGrid + cGrid, 0, 0.0),
+                                 np.insert(cGrid, 0, 0.0))
+
+    start = time.time()
+    distances = []
+    x_hist, g_hist = [], []
+    converged = False
+
+    with np.errstate(divide='ignore', over='ignore', under='ignore', invalid='ignore'):
+
+        # Start from the solution to a problem with one period left
+        solution = update(ConsumptionPolicy(np.array([0.0, 1.0]), np.array([0.0, 1.0])))
+        x = solution.cGrid[1:]
+
+        for it in range(maxiter):
+            solution = update(policy(x))
+            g = solution.cGrid[1:]
+
+            distances.append(np.max(np.abs(g - x)))
+            if distances[-1] < tol:
+                converged = True
+                break
+
+            x_hist.append(x)
+            g_hist.append(g)
+
+            if accel == 'anderson':
+                x_hist, g_hist = x_hist[-memory:], g_hist[-memory:]
+                x_new = anderson_step(x_hist, g_hist)
+            elif accel == 'aitken' and len(x_hist) == 2:
+                # Extrapolate from x_{k-1}, x_k and T(x_k) and start over
+                x_new = aitken_step(x_hist[0], x_hist[1], g)
+                x_hist, g_hist = [], []
+            else:
+                x_new = g
+                if accel is None:
+                    x_hist, g_hist = [], []
+
+            # Fall back to the plain update if the accelerated one is unusable
+            if not valid_cons(aGrid, x_new):
+                x_new = g
+                x_hist, g_hist = [], []
+
+            x = x_new
+
+    solution.converged = converged
+    solution.iterations = len(distances)
+    solution.distances = np.array(distances)
+    solution.solve_time = time.time() - start
+
+    return solution
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Variance reduction for cohort simulations.
+
+Age profiles estimated from plain Monte Carlo draws converge at rate
+1/sqrt(N). Tools.cohort.simulate_cohort can instead build its shocks from
+uniform draws that are spread more evenly:
+
+- 'antithetic': the second half of the cohort uses the uniforms 1 - u of the
+  first half, so agents i and i + N/2 form a pair of mirror image lives.
+- 'sobol': every period's shocks come from a scrambled Sobol sequence. The
+  cohort is split into independently scrambled replicates, whose means give
+  the standard errors. Each period uses its own scramble and a random
+  permutation of the points among the agents, so that the few dimensions of
+  one period's shocks can be used over a long life (Owen's Latin supercube
+  sampling). Without the permutation, the same agents would get shocks from
+  the same part of the distribution in every period.
+
+Income shocks are drawn from their discrete distributions by inversion of the
+cumulative probabilities, and returns and initial conditions from normal
+distributions by inversion of the normal CDF.
+
+age_estimates turns the resulting histories into age profiles with standard
+errors. Independent units (agents, antithetic pairs or replicates) are
+averaged first, and the permanent income of each unit can serve as a control
+variate: its exact mean at every age is known from the deterministic income
+profile, det_income in Calibration/params.py, and the discretized shocks (see
+expected_pLvl).
+"""
+
+import warnings
+
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+# %% Uniform draws
+
+class UniformDraws(object):
+    '''
+    Source of the uniform draws behind the shocks of a simulated cohort.
+
+    Parameters
+    ----------
+    sampling : str
+        'mc' (independent draws), 'antithetic' or 'sobol'.
+    N : int
+        Number of agents. It must be even with antithetic sampling and a
+        multiple of replicates with Sobol sampling (ideally a power of two
+        times replicates).
+    RNG : np.random.Generator
+        Random number generator used for draws and scrambles.
+    replicates : int
+        Number of independently scrambled replicates with Sobol sampling.
+
+    Attributes
+    ----------
+    units : np.array
+        Index of the independent unit (agent, antithetic pair or replicate)
+        that every agent belongs to.
+    '''
+
+    def __init__(self, sampling, N, RNG, replicates=16):
+        self.sampling = sampling
+        self.N = N
+        self.RNG = RNG
+        self.replicates = replicates
+
+        if sampling == 'mc':
+            self.units = np.arange(N)
+        elif sampling == 'antithetic':
+            if N % 2 != 0:
+                raise ValueError('Antithetic sampling needs an even number of agents.')
+            self.units = np.tile(np.arange(N//2), 2)
+        elif sampling == 'sobol':
+            if N % replicates != 0:
+                raise ValueError('With Sobol sampling, the number of agents must ' +
+                                 'be a multiple of the number of replicates.')
+            self.units = np.repeat(np.arange(replicates), N//replicates)
+        else:
+            raise ValueError("sampling must be 'mc', 'antithetic' or 'sobol'.")
+
+    def __call__(self, dims):
+        '''
+        Returns a (dims x N) array of uniform draws for one period.
+        '''
+        if self.sampling == 'mc':
+            return self.RNG.random((dims, self.N))
+
+        if self.sampling == 'antithetic':
+            u = self.RNG.random((dims, self.N//2))
+            return np.hstack((u, 1.0 - u))
+
+        size = self.N//self.replicates
+        with warnings.catch_warnings():
+            # Sizes that are not powers of two are allowed, if less balanced
+            warnings.simplefilter('ignore')
+            u = [qmc.Sobol(dims, scramble=True, seed=self.RNG).random(size)
+                 [self.RNG.permutation(size)] for r in range(self.replicates)]
+        return np.vstack(u).T
+
+def discrete_draws(prob, u):
+    '''
+    Indices of the draws from a discrete distribution with probabilities prob
+    that correspond to the uniforms u.
+    '''
+    cdf = np.cumsum(prob)
+    return np.minimum(np.searchsorted(cdf/cdf[-1], u, side='right'), prob.size - 1)
+
+def normal_draws(mu, sigma, u):
+    '''
+    Draws from a normal distribution that correspond to the uniforms u.
+    '''
+    return mu + sigma*ndtri(u)
+
+# %% Estimates
+
+def expected_pLvl(agent):
+    '''
+    Exact mean of permanent income at every age of a cohort simulated with
+    Tools.cohort.simulate_cohort. It is the deterministic income profile
+    (det_income) adjusted by the mean of the initial distribution and of the
+    discretized permanent shocks.
+    '''
+    T = agent.T_cycle
+    mean = np.zeros(T)
+    level = np.exp(agent.pLvlInitMean + agent.pLvlInitStd**2/2)
+    for t in range(T):
+        IncomeDstn = agent.IncomeDstn[max(t-1, 0)]
+        level = level*np.dot(IncomeDstn[0], IncomeDstn[1])*agent.PermGroFac[max(t-1, 0)]
+        mean[t] = level
+    return mean
+
+def unit_means(units, values):
+    '''
+    Means of an (ages x agents) array over the agents of every unit.
+    '''
+    counts = np.bincount(units)
+    return np.array([np.bincount(units, weights=row)/counts for row in values])
+
+def age_estimates(history, values, control=None, control_mean=None):
+    '''
+    Mean of a simulated variable at every age, with its standard error.
+
+    Parameters
+    ----------
+    history : CohortHistory
+        Histories simulated with survival = 'weights'.
+    values : np.array
+        (ages x agents) array with the variable, e.g. history.cNrmNow_hist or
+        history.pLvlNow_hist*history.mNrmNow_hist.
+    control : np.array
+        Optional (ages x agents) array with a control variate, usually
+        history.pLvlNow_hist.
+    control_mean : np.array
+        Exact mean of the control variate at every age, e.g.
+        expected_pLvl(agent).
+
+    Returns
+    -------
+    mean : np.array
+        Estimated mean at every age.
+    se : np.array
+        Standard error of the estimate at every age.
+    '''
+    if history.alive is not None:
+        raise ValueError("Standard errors need histories simulated with survival = 'weights'.")
+
+    Y = unit_means(history.units, values)
+    n = Y.shape[1]
+    if control is None:
+        return Y.mean(axis=1), Y.std(axis=1, ddof=1)/np.sqrt(n)
+
+    X = unit_means(history.units, control)
+    dX = X - X.mean(axis=1)[:, np.newaxis]
+    dY = Y - Y.mean(axis=1)[:, np.newaxis]
+    varX = (dX**2).sum(axis=1)
+    beta = np.divide((dX*dY).sum(axis=1), varX, out=np.zeros(varX.size),
+                     where=varX > 0)
+
+    mean = Y.mean(axis=1) - beta*(X.mean(axis=1) - control_mean)
+    resid = dY - beta[:, np.newaxis]*dX
+    se = np.sqrt((resid**2).sum(axis=1)/(n - 2)/n)
+    return mean, se